@@ -1,11 +1,22 @@
+import array
+import collections
 import itertools
 import functools
 import operator
+import sys
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from ..lang import H
 from ..lang import sig
 from ..lang import t
 from ..lang import L
+from ..lang import List
+from ..lang import Stream
 from ..lang import __
 from ..lang import caseof
 from ..lang import m
@@ -25,6 +36,205 @@ from Maybe import Nothing
 # Basic functions
 
 
+def __one_pass(elements, *xss):
+    """
+    Wrap the elements of a list computed in one pass over the lists xss: in a
+    Stream if any of xss is a Stream (so that the result is not memoised
+    either), and in a List otherwise.
+    """
+    for xs in xss:
+        if isinstance(xs, Stream):
+            return Stream(elements)
+    return L[elements]
+
+
+def __fusible(make, *xss):
+    """
+    Wrap the elements that make(*iterables) iterates over, where the iterables
+    are the elements of the lists xss (see help(__elements)), like __one_pass.
+    A resulting List keeps make as its producer (see help(List.fusible)), so
+    that a chain of these functions, e.g. sum(map(f, filter(p, xs))), runs as
+    one loop over xs, without keeping the elements of the Lists in between.
+    """
+    def __produce():
+        return make(*[__elements(xs) for xs in xss])
+
+    def __evaluate():
+        for x in __produce():
+            yield x
+
+    ys = __one_pass(__evaluate(), *xss)
+    return ys.fusible(__produce) if isinstance(ys, List) else ys
+
+
+def __elements(xs):
+    """
+    The elements of a list, for a single pass over them: the elements of a
+    List built by __fusible that nothing else has used yet are computed by
+    the pass without being kept in the List (see help(List.elements)).
+    """
+    return xs.elements() if isinstance(xs, List) else xs
+
+
+def __contiguous(xs):
+    """
+    The elements of a finite list, in an array if the list stores them in one
+    (so that they can be reduced without going through the list's iterator),
+    and xs itself otherwise.
+    """
+    if isinstance(xs, List):
+        elements = xs.to_array()
+        if elements is not None:
+            return elements
+    return xs
+
+
+#=============================================================================#
+# Vectorised operations
+#
+# When NumPy is available, operations over Lists of ints or floats that are
+# stored in arrays (see help(List.to_array)) are done with NumPy, if the
+# functions involved are sections of operators that have a NumPy ufunc (e.g.
+# (__*2) or (__+__)). Operations on ints are only vectorised if they cannot
+# overflow, since NumPy ints wrap around where Python ints become longs.
+
+
+__ufuncs__ = {} if numpy is None else {
+    operator.add: numpy.add,
+    operator.sub: numpy.subtract,
+    operator.mul: numpy.multiply,
+}
+
+
+def __ndarray(xs, evaluate=False):
+    """
+    The elements of a non-empty List of ints or floats as a NumPy array, or
+    None if NumPy is not available or the List does not store its elements
+    in an array. If evaluate is False, None is also returned if the List is
+    not fully evaluated yet.
+    """
+    if numpy is None or not isinstance(xs, List):
+        return None
+    elements = xs.to_array(evaluate)
+    if elements is None or len(elements) == 0:
+        return None
+    return numpy.frombuffer(elements, elements.typecode)
+
+
+def __from_ndarray(result):
+    """
+    A List of the elements of a NumPy array of ints or floats.
+    """
+    elements = array.array(result.dtype.char)
+    elements.fromstring(result.tostring())
+    return L[elements]
+
+
+def __bound(x):
+    """
+    The largest absolute value of a number or an array of ints.
+    """
+    if isinstance(x, numpy.ndarray):
+        return max(abs(int(x.max())), abs(int(x.min())))
+    return abs(x)
+
+
+def __has_nan(elements):
+    """
+    Whether a NumPy array has a NaN in it. NumPy's reductions propagate NaNs,
+    while the result of Python's min and max depends on where they are.
+    """
+    return elements.dtype.char == "d" and bool(numpy.isnan(elements).any())
+
+
+def __vectorised(op, flipped, x, y):
+    """
+    Apply a binary operator to NumPy arrays (or an array and a number) with
+    the corresponding ufunc.
+
+    Returns: the resulting array, or None if the operator has no ufunc, an
+    operand is not an int or float (array), or the result could overflow
+    """
+    ufunc = __ufuncs__.get(op)
+    if ufunc is None:
+        return None
+
+    is_int = []
+    for operand in (x, y):
+        if isinstance(operand, numpy.ndarray):
+            is_int.append(operand.dtype.char == "l")
+        elif type(operand) in (int, float):
+            is_int.append(type(operand) is int)
+        else:
+            return None
+
+    if is_int == [True, True]:
+        bound = __bound(x) * __bound(y) if op is operator.mul else \
+                __bound(x) + __bound(y)
+        if bound > sys.maxint:
+            return None
+    return ufunc(y, x) if flipped else ufunc(x, y)
+
+
+def __scan_ndarray(f, z, xs):
+    """
+    scanl(f, z, xs) (or scanl1(f, xs) if z is None) with NumPy, if f is
+    (__+__) or (__*__) and xs is a fully evaluated List of ints or floats.
+    Sums of ints are only vectorised if they cannot overflow, and products
+    only for floats.
+
+    Returns: a List of the results, or None if this is not possible
+    """
+    section = getattr(f, "__operator__", None)
+    if numpy is None or section is None or len(section[2]) > 0:
+        return None
+    elements = __ndarray(xs)
+    if elements is None:
+        return None
+
+    is_int = elements.dtype.char == "l"
+    if z is not None:
+        if type(z) is not (int if is_int else float):
+            return None
+        elements = numpy.concatenate(([z], elements))
+
+    if section[0] is operator.add and (not is_int or
+            __bound(elements) * len(elements) <= sys.maxint):
+        return __from_ndarray(elements.cumsum())
+    elif section[0] is operator.mul and not is_int:
+        return __from_ndarray(elements.cumprod())
+    return None
+
+
+def __map_ndarray(f, *xss):
+    """
+    Apply a section to the elements of fully evaluated Lists of ints or
+    floats with a NumPy ufunc: a single section (e.g. (__*2)) to the elements
+    of one List, or a double section (e.g. (__+__)) to the elements of two
+    Lists, pairwise.
+
+    Returns: a List of the results, or None if f cannot be applied this way
+    """
+    section = getattr(f, "__operator__", None)
+    if numpy is None or section is None:
+        return None
+    op, flipped, operands = section
+    if len(operands) + len(xss) != 2:
+        return None
+
+    arrays = []
+    for xs in xss:
+        elements = __ndarray(xs)
+        if elements is None:
+            return None
+        arrays.append(elements)
+    length = min(len(a) for a in arrays)
+    arrays = [a[:length] for a in arrays]
+
+    result = __vectorised(op, flipped, *(arrays + list(operands)))
+    return None if result is None else __from_ndarray(result)
+
+
 @sig(H/ ["a"] >> "a")
 def head(xs):
     """
@@ -103,6 +313,8 @@ def length(xs):
     implementation is optimized for structures that are similar to cons-lists,
     because there is no general way to do better.
     """
+    if isinstance(xs, Stream):
+        return functools.reduce(lambda n, _: n + 1, xs, 0)
     return len(xs)
 
 
@@ -117,7 +329,57 @@ def map(f, xs):
 
     map(f, xs) is the list obtained by applying f to each element of xs
     """
-    return L[itertools.imap(f, xs)]
+    ys = __map_ndarray(f, xs)
+    if ys is not None:
+        return ys
+    return __fusible(lambda xs: itertools.imap(f, xs), xs)
+
+
+@sig(H/ int >> (H/ "a" >> "b") >> ["a"] >> ["b"])
+def mapConcurrent(n, f, xs):
+    """
+    mapConcurrent :: int -> (a -> b) -> [a] -> [b]
+
+    mapConcurrent(n, f, xs) is the list obtained by applying f to each element
+    of xs, like map, except that f is applied to up to n elements at a time,
+    each in its own thread, ahead of the results that are used. This speeds
+    up functions that spend their time waiting (e.g. on the network). The
+    results are in the same order as the elements of xs, and an error raised
+    by f is raised when the list reaches its result.
+    """
+    if n < 1:
+        raise ValueError("mapConcurrent needs to apply f to at least one "
+                         "element at a time")
+
+    def __start(x):
+        outcome = []
+        def __apply():
+            try:
+                outcome.append((True, f(x)))
+            except Exception:
+                outcome.append((False, sys.exc_info()))
+        thread = threading.Thread(target=__apply)
+        thread.daemon = True
+        thread.start()
+        return thread, outcome
+
+    def __result(call):
+        thread, outcome = call
+        thread.join()
+        is_returned, result = outcome[0]
+        if is_returned:
+            return result
+        raise result[0], result[1], result[2]
+
+    def __map_concurrent(xs):
+        calls = collections.deque()
+        for x in xs:
+            calls.append(__start(x))
+            if len(calls) == n:
+                yield __result(calls.popleft())
+        while calls:
+            yield __result(calls.popleft())
+    return __one_pass(__map_concurrent(xs), xs)
 
 
 @sig(H/ ["a"] >> ["a"] )
@@ -127,7 +389,7 @@ def reverse(xs):
 
     reverse(xs) returns the elements of xs in reverse order. xs must be finite.
     """
-    return L[(x for x in xs[::-1])]
+    return xs[::-1]
 
 
 @sig(H/ "a" >> ["a"] >> ["a"] )
@@ -254,9 +516,19 @@ def foldr(f, z, xs):
     right-identity of the operator), and a list, reduces the list using the
     binary operator, from right to left
     """
+    return __foldr_reversed(f, z, xs[::-1])
+
+
+@sig(H/ (H/ "a" >> "b" >> "b") >> "b" >> ["a"] >> "b")
+def __foldr_reversed(f, acc, xs):
+    """
+    Tail-recursive foldr over a reversed list, so that folds over long lists
+    run in constant stack space.
+    """
     return ~(caseof(xs)
-                | m(L[[]])     >> z
-                | m(m.a ^ m.b) >> f(p.a, foldr(f, z, p.b)))
+                | m(L[[]])     >> acc
+                | m(m.a ^ m.b) >> __foldr_reversed.tailcall(f, f(p.a, acc),
+                                                            p.b))
 
 
 @sig(H/ (H/ "a" >> "a" >> "a") >> ["a"] >> "a")
@@ -294,7 +566,7 @@ def concatMap(f, xs):
 
     Map a function over a list and concatenate the results.
     """
-    return concat(map(f, xs))
+    return __fusible(lambda xs: (y for x in xs for y in __elements(f(x))), xs)
 
 
 @sig(H/ [bool] >> bool)
@@ -354,7 +626,15 @@ def sum(xs):
 
     The sum function computes the sum of a finite list of numbers.
     """
-    return functools.reduce(operator.add, xs, 0)
+    elements = __ndarray(xs, evaluate=True)
+    if elements is not None and elements.dtype.char == "d":
+        # floats are summed in order (ndarray.sum sums them pairwise), and
+        # from 0, like the fold below
+        return 0 + elements.cumsum()[-1].item()
+    elif elements is not None and \
+         __bound(elements) * len(elements) <= sys.maxint:
+        return elements.sum().item()
+    return functools.reduce(operator.add, __contiguous(xs), 0)
 
 
 @sig(H[(Num, "a")]/ ["a"] >> "a")
@@ -364,7 +644,11 @@ def product(xs):
 
     The product function computes the product of a finite list of numbers.
     """
-    return functools.reduce(operator.mul, xs, 1)
+    elements = __ndarray(xs, evaluate=True)
+    if elements is not None and elements.dtype.char == "d":
+        # in order, like the fold below
+        return elements.cumprod()[-1].item()
+    return functools.reduce(operator.mul, __contiguous(xs), 1)
 
 
 @sig(H[(Ord, "a")]/ ["a"] >> "a")
@@ -376,7 +660,11 @@ def minimum(xs):
     finite, and of an ordered type. It is a special case of minimumBy, which
     allows the programmer to supply their own comparison function.
     """
-    return min(xs)
+    elements = __ndarray(xs, evaluate=True)
+    if elements is not None and not __has_nan(elements):
+        # the first of the smallest elements, as min returns
+        return elements[elements.argmin()].item()
+    return min(__contiguous(xs))
 
 
 @sig(H[(Ord, "a")]/ ["a"] >> "a")
@@ -388,7 +676,11 @@ def maximum(xs):
     finite, and of an ordered type. It is a special case of maximumBy, which
     allows the programmer to supply their own comparison function.
     """
-    return max(xs)
+    elements = __ndarray(xs, evaluate=True)
+    if elements is not None and not __has_nan(elements):
+        # the first of the largest elements, as max returns
+        return elements[elements.argmax()].item()
+    return max(__contiguous(xs))
 
 
 #=============================================================================#
@@ -403,7 +695,16 @@ def scanl(f, z, xs):
     scanl is similar to foldl, but returns a list of successive reduced values
     from the left
     """
-    raise NotImplementedError()
+    ys = __scan_ndarray(f, z, xs)
+    if ys is not None:
+        return ys
+
+    def __scanl(f, acc, xs):
+        yield acc
+        for x in xs:
+            acc = f(acc, x)
+            yield acc
+    return __one_pass(__scanl(f, z, xs), xs)
 
 
 @sig(H/ (H/ "a" >> "a" >> "a") >> ["a"] >> ["a"])
@@ -413,7 +714,18 @@ def scanl1(f, xs):
 
     scanl1 is a variant of scanl that has no starting value argument
     """
-    raise NotImplementedError()
+    ys = __scan_ndarray(f, None, xs)
+    if ys is not None:
+        return ys
+
+    def __scanl1(f, xs):
+        xs = iter(xs)
+        for acc in xs:
+            yield acc
+            for x in xs:
+                acc = f(acc, x)
+                yield acc
+    return __one_pass(__scanl1(f, xs), xs)
 
 
 @sig(H/ (H/ "a" >> "a" >> "b") >> "b" >> ["a"] >> ["b"])
@@ -539,10 +851,12 @@ def unfoldr(f, x):
     Just (a,b), in which case, a is prepended to the list and b is used as the
     next element in a recursive call
     """
-    y = f(x)
-    if y == Nothing:
-        return L[[]]
-    return y[0][0] ^ unfoldr(f, y[0][1])
+    def __unfoldr(x):
+        y = f(x)
+        while y != Nothing:
+            yield y[0][0]
+            y = f(y[0][1])
+    return L[__unfoldr(x)]
 
 
 #=============================================================================#
@@ -590,7 +904,7 @@ def takeWhile(p, xs):
     takeWhile, applied to a predicate p and a list xs, returns the longest
     prefix (possibly empty) of xs of elements that satisfy p
     """
-    return L[itertools.takewhile(p, xs)]
+    return __fusible(lambda xs: itertools.takewhile(p, xs), xs)
 
 
 @sig(H/ (H/ "a" >> bool) >> ["a"] >> ["a"])
@@ -600,7 +914,7 @@ def dropWhile(p, xs):
 
     dropWhile(p, xs) returns the suffix remaining after takeWhile(p, xs)
     """
-    return L[itertools.dropwhile(p, xs)]
+    return __fusible(lambda xs: itertools.dropwhile(p, xs), xs)
 
 
 @sig(H/ (H/ "a" >> bool) >> ["a"] >> ["a"])
@@ -812,7 +1126,7 @@ def filter(f, xs):
     filter, applied to a predicate and a list, returns the list of those
     elements that satisfy the predicate
     """
-    return L[itertools.ifilter(f, xs)]
+    return __fusible(lambda xs: itertools.ifilter(f, xs), xs)
 
 
 @sig(H/ (H/ "a" >> bool) >> ["a"] >> (["a"], ["a"]))
@@ -900,7 +1214,7 @@ def zip(xs, ys):
     zip takes two lists and returns a list of corresponding pairs. If one input
     list is short, excess elements of the longer list are discarded.
     """
-    return L[itertools.izip(xs, ys)]
+    return __fusible(itertools.izip, xs, ys)
 
 
 @sig(H/ ["a"] >> ["b"] >> ["c"] >> [("a", "b", "c")])
@@ -969,7 +1283,10 @@ def zipWith(fn, xs, ys):
     argument, instead of a tupling function. For example, zipWith (+) is
     applied to two lists to produce the list of corresponding sums.
     """
-    return L[(fn(*s) for s in zip(xs, ys))]
+    zs = __map_ndarray(fn, xs, ys)
+    if zs is not None:
+        return zs
+    return __fusible(lambda xs, ys: itertools.imap(fn, xs, ys), xs, ys)
 
 
 @sig(H/ (H/ "a" >> "b" >> "c" >> "d") >> ["a"] >> ["b"] >> ["c"] >> ["d"])
@@ -42,11 +42,17 @@ from lang import NoGuardMatchException
 
 ## Lists/list comprehensions
 from lang import L
+from lang import Stream
+from lang import StreamConsumedError
+from lang import EvictedError
+from lang import records
 
 ## ADT creation
 from lang import data
 from lang import d
 from lang import deriving
+from lang import Interned
+from lang import intern_stats
 
 ## Type signatures
 from lang import sig
@@ -57,6 +63,7 @@ from lang import TypeSignatureError
 
 ## Pattern matching
 from lang import caseof
+from lang import equations
 from lang import p
 from lang import m
 from lang import IncompletePatternError
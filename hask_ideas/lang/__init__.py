@@ -4,6 +4,8 @@ from typeclasses import Read
 from typeclasses import Eq
 from typeclasses import Ord
 from typeclasses import Bounded
+from typeclasses import Interned
+from typeclasses import intern_stats
 from lazylist import Enum
 from lazylist import succ
 from lazylist import pred
@@ -25,6 +27,7 @@ from type_system import TypeSignatureError
 
 from syntax import undefined
 from syntax import caseof
+from syntax import equations
 from syntax import m
 from syntax import p
 from syntax import IncompletePatternError
@@ -48,3 +51,7 @@ from syntax import _i
 
 from lazylist import List
 from lazylist import L
+from lazylist import Stream
+from lazylist import StreamConsumedError
+from lazylist import EvictedError
+from lazylist import records
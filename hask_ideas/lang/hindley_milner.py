@@ -427,3 +427,20 @@ def occursIn(t, types):
         True if t occurs in any of types, otherwise False
     """
     return any(occursInType(t, t2) for t2 in types)
+
+
+def isGround(t):
+    """
+    Checks whether a type expression contains no uninstantiated type variables.
+
+    Args:
+        t: The type to be tested
+
+    Returns:
+        True if t contains no uninstantiated type variables, otherwise False
+    """
+    pruned_t = prune(t)
+    if isinstance(pruned_t, TypeVariable) or \
+       isinstance(pruned_t.name, TypeVariable):
+        return False
+    return all(isGround(t2) for t2 in pruned_t.types)
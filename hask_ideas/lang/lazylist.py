@@ -1,14 +1,25 @@
+import array
+import atexit
 import collections
 import itertools
+import mmap
+import os
+import sys
+import threading
 
 from hindley_milner import TypeVariable
 from hindley_milner import ListType
 from hindley_milner import unify
+from hindley_milner import prune
+from hindley_milner import isGround
 
 from type_system import typeof
+from type_system import monotype_classes
 from type_system import Typeclass
 from type_system import Hask
 from type_system import build_instance
+from type_system import build_sig_arg
+from type_system import TypeSignatureHKT
 
 from typeclasses import Show
 from typeclasses import show
@@ -19,6 +30,7 @@ from syntax import Syntax
 from syntax import instance
 from syntax import sig
 from syntax import H
+from syntax import __signature__
 
 
 class Enum(Typeclass):
@@ -111,7 +123,7 @@ def enumFromThen(start, second):
 
     Used in translation of [n, n_, ...]
     """
-    return L[Enum[start].enumFromThen(start, second)]
+    return List(tail=Range.of(start, second))
 
 
 @sig(H/ "a" >> ["a"])
@@ -121,7 +133,7 @@ def enumFrom(start):
 
     Used in translation of L[n, ...]
     """
-    return L[Enum[start].enumFrom(start)]
+    return List(tail=Range.of(start))
 
 
 @sig(H/ "a" >> "a" >> "a" >> ["a"])
@@ -131,7 +143,7 @@ def enumFromThenTo(start, second, end):
 
     Used in translation of L[n, n_, ..., m]
     """
-    return L[Enum[start].enumFromThenTo(start, second, end)]
+    return List(tail=Range.of(start, second, end))
 
 
 @sig(H/ "a" >> "a" >> ["a"])
@@ -141,7 +153,7 @@ def enumFromTo(start, end):
 
     Used in translation of L[n, ..., m]
     """
-    return L[Enum[start].enumFromTo(start, end)]
+    return List(tail=Range.of(start, end=end))
 
 
 instance(Enum, int).where(fromEnum=int, toEnum=int)
@@ -154,71 +166,1181 @@ instance(Enum, str).where(fromEnum=ord, toEnum=chr)
 # List
 
 
-class List(collections.Sequence, Hask):
+class EvictedError(IndexError):
+    pass
+
+
+class Range(object):
     """
-    Statically typed lazy sequence datatype.
+    The elements of an arithmetic sequence of an Enum type, i.e. toEnum(first),
+    toEnum(first + step), toEnum(first + 2 * step), and so on, for `length`
+    elements (or infinitely many, if length is None).
 
-    See help(L) for more information.
+    Any element of a Range, its length, whether it contains an item, and its
+    slices (which are Ranges too) are computed without going through the
+    elements before them.
     """
-    def __init__(self, head=None, tail=None):
-        self.__head = []
-        self.__tail = itertools.chain([])
-        self.__is_evaluated = True
-
-        if head is not None and len(head) > 0:
-            fst = head[0]
-            for fst, other in zip(itertools.repeat(fst), head):
-                unify(typeof(fst), typeof(other))
-            self.__head.extend(head)
-        if tail is not None:
-            self.__tail = itertools.chain(self.__tail, tail)
-            self.__is_evaluated = False
+    __slots__ = ("toEnum", "fromEnum", "first", "step", "length")
+
+    def __init__(self, toEnum, fromEnum, first, step, length=None):
+        self.toEnum = toEnum
+        self.fromEnum = fromEnum
+        self.first = first
+        self.step = step
+        self.length = length
         return
 
-    def __type__(self):
-        if self.__is_evaluated:
-            if len(self.__head) == 0:
-                return ListType(TypeVariable())
-            return ListType(typeof(self[0]))
+    @staticmethod
+    def of(start, second=None, end=None):
+        """
+        The Range of the arithmetic sequence from start (with second as its
+        second element, or the successor of start if second is None) up to
+        end (or without end, if end is None), with the same elements as
+        Enum's enumFromThenTo and enumFromThen.
+        """
+        enum = Enum[start]
+        first = enum.fromEnum(start)
+        second = enum.succ(start) if second is None else second
+        step = enum.fromEnum(second) - first
+        if end is None:
+            length = None
+        elif first > enum.fromEnum(end):
+            length = 0
+        elif step <= 0:
+            length = None
+        else:
+            length = (enum.fromEnum(end) - first) // step + 1
+        return Range(enum.toEnum, enum.fromEnum, first, step, length)
 
-        elif len(self.__head) == 0:
-            self.__next()
-            return self.__type__()
+    def __iter__(self):
+        numbers = itertools.count(self.first, self.step)
+        if self.length is not None:
+            numbers = itertools.islice(numbers, self.length)
+        return itertools.imap(self.toEnum, numbers)
 
-        return ListType(typeof(self[0]))
+    def has(self, i):
+        """
+        Whether there is an element at position i.
+        """
+        return i >= 0 and (self.length is None or i < self.length)
+
+    def get(self, i):
+        """
+        The element at position i (which must be in the Range).
+        """
+        return self.toEnum(self.first + i * self.step)
 
-    def __next(self):
+    def contains(self, x):
         """
-        Evaluate the next element of the tail, and add it to the head.
+        Whether x is an element of the Range.
+
+        Returns: True or False, or None if x is not of the same type as the
+        elements of the Range (so its position cannot be computed)
+        """
+        if self.length == 0 or type(x) is not type(self.get(0)):
+            return None
+
+        # e.g. a string that is not a single character is not an element of a
+        # Range of characters, though it is of the same type
+        try:
+            number = self.fromEnum(x)
+            is_element = self.toEnum(number) == x
+        except (TypeError, ValueError):
+            is_element = False
+        if not is_element:
+            return False
+
+        offset = number - self.first
+        if self.step == 0:
+            return offset == 0
+
+        i, remainder = divmod(offset, self.step)
+        return remainder == 0 and i >= 0 and \
+               (self.length is None or i < self.length)
+
+    def position(self, x):
+        """
+        The position of the first occurrence of x in the Range.
+
+        Returns: the position, -1 if x is not in the Range, or None if x is
+        not of the same type as the elements of the Range
         """
-        if self.__is_evaluated:
-            raise StopIteration
+        found = self.contains(x)
+        if not found:
+            return None if found is None else -1
+        elif self.step == 0:
+            return 0
+        return (self.fromEnum(x) - self.first) // self.step
+
+    def count(self, x):
+        """
+        The number of occurrences of x in the Range (which must be finite), or
+        None if x is not of the same type as the elements of the Range.
+        """
+        found = self.contains(x)
+        if not found:
+            return None if found is None else 0
+        return self.length if self.step == 0 else 1
+
+    def slice(self, ix):
+        """
+        The elements of the Range selected by a slice.
+
+        Returns: a Range, or None if the Range is infinite and the slice has
+        negative bounds or step
+        """
+        if self.length is not None:
+            start, stop, step = ix.indices(self.length)
+            length = max(0, (stop - start + step - (1 if step > 0 else -1))
+                            // step)
+        else:
+            start = 0 if ix.start is None else ix.start
+            step = 1 if ix.step is None else ix.step
+            if start < 0 or step <= 0 or (ix.stop is not None and
+                                          ix.stop < 0):
+                return None
+            length = None if ix.stop is None else \
+                     max(0, (ix.stop - start + step - 1) // step)
+        return Range(self.toEnum, self.fromEnum, self.first + start *
+                     self.step, self.step * step, length)
+
+
+class RecordFile(object):
+    """
+    The records of a file, mapped into memory: its records of `width` bytes,
+    or (if width is None) its records separated by a delimiter, such as its
+    lines, without the delimiters.
+
+    The delimited records are found by scanning the file only as far as the
+    records that have been asked for (in chunks of records), and where each
+    one ends is kept (in an array, taking 8 bytes per record), so that a
+    record that was found before is read without scanning again. The records
+    themselves are not kept: reading one slices it out of the mapped file,
+    or, if copy is False, makes a read-only buffer of its bytes in the mapped
+    file without copying them (which saves memory for large records, but
+    takes longer than copying records of up to several kilobytes).
+
+    A RecordFile can be shared between threads: scanning for more records is
+    done by one thread at a time.
+    """
+    chunk_size = 1024
+
+    def __init__(self, path, width=None, delimiter="\n", copy=True):
+        if width is not None and width < 1:
+            raise ValueError("A record must be at least one byte wide")
+        elif width is None and len(delimiter) == 0:
+            raise ValueError("The delimiter of records must not be empty")
+
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # an empty file cannot be mapped
+            self.data = "" if size == 0 else \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.size = size
+        self.width = width
+        self.delimiter = delimiter
+        self.copy = copy
+        self.ends = array.array("l")
+        if width is None:
+            self.length = 0 if size == 0 else None
+        elif size % width != 0:
+            raise ValueError("The size of %s is not a multiple of %d bytes" %
+                             (path, width))
         else:
+            self.length = size // width
+        self.__lock = threading.Lock()
+        return
+
+    def __len__(self):
+        self.has(sys.maxint)
+        return self.length
+
+    def has(self, i):
+        """
+        Whether the file has a record at position i, scanning the file up to
+        that record if it has not been found yet.
+        """
+        if self.length is not None:
+            return 0 <= i < self.length
+        elif i < len(self.ends):
+            return i >= 0
+
+        with self.__lock:
+            find, delimiter, size = self.data.find, self.delimiter, self.size
+            ends = self.ends
+            end_of_chunk = max(i, len(ends) + self.chunk_size - 1)
+            start = 0 if len(ends) == 0 else ends[-1] + len(delimiter)
+            while self.length is None and len(ends) <= end_of_chunk:
+                end = find(delimiter, start)
+                if end < 0:
+                    end = size
+                ends.append(end)
+                # a delimiter at the end of the file does not start a record
+                start = end + len(delimiter)
+                if start >= size:
+                    self.length = len(ends)
+        return 0 <= i < len(ends)
+
+    def get(self, i):
+        """
+        The record at position i (which must be in the file).
+        """
+        for record in self.records((i,)):
+            return record
+
+    def records(self, positions):
+        """
+        The records at the given positions (which must be in the file).
+        """
+        data, width, ends, copy = self.data, self.width, self.ends, self.copy
+        skip = len(self.delimiter)
+        for i in positions:
+            if width is not None:
+                start = i * width
+                end = start + width
+            else:
+                start = ends[i - 1] + skip if i > 0 else 0
+                end = ends[i]
+            yield data[start:end] if copy else buffer(data, start, end - start)
+
+
+class Records(object):
+    """
+    The records of a RecordFile at positions start, start + step, start +
+    2 * step, and so on, up to (but not including) stop, or up to the end of
+    the file if stop is None, decoded by a function (if decode is not None).
+
+    Records are used by Lists like Ranges (see help(Range)): any element,
+    and slices (which are Records of the same file), are found without going
+    through the elements before them, and the elements are decoded afresh
+    each time instead of being kept. Finding the length of Records of a file
+    of delimited records scans the entire file.
+
+    Once the type of the elements is known (see help(Records.check)), each
+    decoded element is type checked against it as it is decoded.
+    """
+    __slots__ = ("file", "decode", "start", "stop", "step", "type", "classes")
+
+    def __init__(self, file, decode=None, start=0, stop=None, step=1,
+                 element_type=None, classes=None):
+        self.file = file
+        self.decode = decode
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.type = element_type
+        self.classes = classes
+        return
+
+    def check(self, element):
+        """
+        Type check a decoded element against the type of the elements, if it
+        is known. As in Spine.check, elements whose classes alone fix their
+        type (see help(monotype_classes)) are checked by their class, once an
+        element of the same class has been unified with the type.
+
+        Returns: the element
+
+        Raises:
+            TypeError, if the element does not type check
+        """
+        if self.type is None or \
+           (self.classes is not None and type(element) in self.classes):
+            return element
+
+        unify(self.type, typeof(element))
+        if self.classes is None:
+            self.classes = monotype_classes(element)
+        return element
+
+    def __slice(self, start, stop, step):
+        """
+        The Records of the same file at other positions.
+        """
+        return Records(self.file, self.decode, start, stop, step, self.type,
+                       self.classes)
+
+    def __iter__(self):
+        file, decode, step = self.file, self.decode, self.step
+        i = 0
+        while self.has(i):
+            # read all of the records that have been found so far in one go
+            if step < 0:
+                stop = self.stop
+            else:
+                found = len(file.ends) if file.length is None else file.length
+                stop = found if self.stop is None else min(found, self.stop)
+            positions = xrange(self.start + i * step, stop, step)
+            elements = file.records(positions)
+            if decode is None:
+                for element in elements:
+                    yield element
+            else:
+                # elements of classes that have been checked need no check
+                classes = self.classes or ()
+                for element in itertools.imap(decode, elements):
+                    if type(element) not in classes:
+                        self.check(element)
+                        classes = self.classes or ()
+                    yield element
+            i += len(positions)
+
+    @property
+    def length(self):
+        if self.step < 0 or (self.stop is not None and
+                             (self.stop <= self.start or
+                              self.file.has(self.stop - 1))):
+            return len(xrange(self.start, self.stop, self.step))
+        return len(xrange(self.start, len(self.file), self.step))
+
+    def has(self, i):
+        """
+        Whether there is an element at position i.
+        """
+        j = self.start + i * self.step
+        if i < 0:
+            return False
+        elif self.step < 0:
+            return j > self.stop
+        return (self.stop is None or j < self.stop) and self.file.has(j)
+
+    def get(self, i):
+        """
+        The element at position i (which must be in the Records).
+        """
+        record = self.file.get(self.start + i * self.step)
+        return record if self.decode is None else \
+               self.check(self.decode(record))
+
+    def contains(self, x):
+        """
+        Whether x is an element of the Records.
+        """
+        return self.position(x) >= 0
+
+    def position(self, x):
+        """
+        The position of the first occurrence of x in the Records, or -1 if x
+        is not in the Records.
+        """
+        for i, item in enumerate(self):
+            if item == x:
+                return i
+        return -1
+
+    def count(self, x):
+        """
+        The number of occurrences of x in the Records.
+        """
+        return sum(1 for item in self if item == x)
+
+    def slice(self, ix):
+        """
+        The elements of the Records selected by a slice, as Records.
+        """
+        step = 1 if ix.step is None else ix.step
+        if self.step > 0 and step > 0 and \
+           (ix.start is None or ix.start >= 0) and \
+           (ix.stop is None or ix.stop >= 0):
+            # forward slices with no negative bounds do not need the length
+            start = self.start + (ix.start or 0) * self.step
+            stops = [s for s in (self.stop, None if ix.stop is None else
+                                 self.start + ix.stop * self.step)
+                     if s is not None]
+            stop = min(stops) if len(stops) > 0 else None
+            return self.__slice(start, stop, self.step * step)
+
+        start, stop, step = ix.indices(self.length)
+        length = len(xrange(start, stop, step))
+        start = self.start + start * self.step
+        step = self.step * step
+        return self.__slice(start, start + length * step, step)
+
+
+class Prefetcher(object):
+    """
+    An iterator over the elements of an iterator, which a background thread
+    evaluates ahead of time into a buffer of at most `depth` elements.
+
+    The elements come out in order, and an error raised by the iterator is
+    raised again (with its traceback) once the elements before it have been
+    used. The thread stops when the iterator is exhausted, or as soon as the
+    Prefetcher is no longer referenced (e.g. the List it belongs to is only
+    used up to some point), in which case the iterator is closed if it has a
+    close method (e.g. a generator or a file). The threads that are still
+    running when the interpreter exits are stopped the same way.
+    """
+    def __init__(self, iterator, depth):
+        self.__items = collections.deque()
+        self.__condition = threading.Condition(threading.Lock())
+        self.__stopped = threading.Event()
+        self.__error = []
+
+        # the thread must not refer to the Prefetcher itself, so that it can
+        # be stopped when the Prefetcher is garbage collected
+        thread = threading.Thread(target=Prefetcher.__produce,
+                                  args=(iterator, depth, self.__items,
+                                        self.__condition, self.__stopped,
+                                        self.__error))
+        thread.daemon = True
+        __prefetchers__[self.__stopped] = (thread, self.__condition)
+        thread.start()
+        return
+
+    # put in the buffer after the last element
+    __end = object()
+
+    @staticmethod
+    def __produce(iterator, depth, items, condition, stopped, error):
+        """
+        Evaluate the elements of an iterator into a buffer, waiting while the
+        buffer is full, until the iterator is exhausted or raises an error, or
+        the Prefetcher is stopped.
+        """
+        try:
+            for item in iterator:
+                with condition:
+                    while len(items) >= depth and not stopped.is_set():
+                        condition.wait()
+                    if stopped.is_set():
+                        break
+                    items.append(item)
+                    condition.notify()
+        except Exception:
+            error.append(sys.exc_info())
+
+        if stopped.is_set() and hasattr(iterator, "close"):
+            iterator.close()
+        with condition:
+            items.append(Prefetcher.__end)
+            condition.notify()
+        __prefetchers__.pop(stopped, None)
+        return
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        with self.__condition:
+            while len(self.__items) == 0:
+                self.__condition.wait()
+            item = self.__items[0]
+            if item is not Prefetcher.__end:
+                self.__items.popleft()
+                self.__condition.notify()
+                return item
+
+        if len(self.__error) > 0:
+            error_type, error, traceback = self.__error.pop()
+            raise error_type, error, traceback
+        raise StopIteration
+
+    def __del__(self):
+        Prefetcher.stop(self.__stopped, self.__condition)
+
+    @staticmethod
+    def stop(stopped, condition):
+        """
+        Stop the thread of a Prefetcher, given its stopped event and its
+        condition.
+        """
+        stopped.set()
+        with condition:
+            condition.notify()
+
+
+# the threads of the Prefetchers that are running, with their conditions, by
+# their stopped events
+__prefetchers__ = {}
+
+
+def __stop_prefetchers():
+    """
+    Stop the threads of the Prefetchers that are still running when the
+    interpreter exits, and wait (briefly) for them to finish, before the
+    modules they use are torn down under them.
+    """
+    running = __prefetchers__.items()
+    for stopped, (thread, condition) in running:
+        Prefetcher.stop(stopped, condition)
+    for stopped, (thread, condition) in running:
+        thread.join(1)
+
+atexit.register(__stop_prefetchers)
+
+
+# held while creating the lock of a spine (see help(Spine.lock))
+__spine_locks__ = threading.Lock()
+
+
+# typecodes for the arrays that store the elements of a spine, by the classes
+# of the elements (see help(monotype_classes))
+__array_typecodes__ = {
+    frozenset((int,)): "l",
+    frozenset((float,)): "d"
+}
+
+
+class Spine(object):
+    """
+    Shared storage behind one or more Lists: the elements evaluated so far
+    (the head), and the iterator that produces the rest (the tail).
+
+    A List is a view of a spine starting at some position, so taking the tail
+    or a suffix of a List shares the spine instead of copying it, and forcing
+    an element through any of the views makes it available to all of them.
+
+    Elements consed onto the front of a spine are stored in a second list
+    (the front, in reverse order) at negative positions, so consing onto a
+    List that starts at the front of its spine shares the spine too.
+
+    A spine created by concatenating Lists keeps the Lists (its parts) and
+    their type until it is evaluated, so that concatenations of
+    concatenations can be evaluated without nesting their iterators.
+
+    A spine created by one of the functions of Data.List that transform lists
+    (e.g. map or filter) keeps its producer, a function that iterates over its
+    elements afresh, until its tail is finished. Another of those functions
+    can then claim the spine's tail (see help(Spine.claim)) and evaluate it
+    itself, so that a chain of them runs as one loop without keeping the
+    elements of the Lists in between.
+
+    The tail is evaluated in chunks, and the elements of each chunk are type
+    checked together (see help(Spine.check)).
+
+    A spine may retain only the last elements that were evaluated from its
+    tail (at least `retain` of them, and at most about twice as many, plus
+    one chunk). Older elements are dropped from the start of the head, and
+    asking for one of them raises an EvictedError.
+
+    Once the elements of a spine are known to be ints or floats, its head is
+    stored in an array.array instead of a list, which takes a fraction of the
+    memory and lets the elements be scanned and copied in bulk.
+
+    The spine of an arithmetic sequence (e.g. L[1, ..., n]) keeps the Range
+    of its elements from position 0 on, and the spine of the records of a
+    file keeps its Records, so that Lists can find their length, elements
+    and slices without evaluating the tail.
+
+    A spine can be shared between threads. Evaluating the tail and consing
+    onto the front are done by one thread at a time, holding the spine's
+    lock, while the elements that are already evaluated are read without
+    locking: the head and the front only ever grow at their ends, and a
+    finished tail is only marked as such once its last elements are in the
+    head. (A spine that retains only some of its elements drops them from
+    the start of the head, so it should only be traversed by one thread.)
+    """
+    chunk_size = 1024
+
+    def __init__(self, head=(), tail=None, retain=None):
+        if retain is not None and retain < 1:
+            raise ValueError("A List must retain at least one element")
+        self.head = head if isinstance(head, array.array) else list(head)
+        self.front = []
+        self.tail = tail
+        self.is_evaluated = tail is None
+        self.parts = None
+        self.type = None
+        self.error = None
+        self.retain = retain
+        self.dropped = 0
+        self.range = None
+        self.producer = None
+        self.__lock = None
+
+    def lock(self):
+        """
+        The lock that is held while evaluating the tail or consing onto the
+        front. It is reentrant, so that a tail can use the spine's own
+        evaluated elements, and it is only created once it is first needed.
+        """
+        if self.__lock is None:
+            with __spine_locks__:
+                if self.__lock is None:
+                    self.__lock = threading.RLock()
+        return self.__lock
+
+    def next(self, n=1):
+        """
+        Evaluate up to n more elements of the tail, and add them to the head.
+
+        If evaluating or type checking an element fails, the elements before
+        it are still added, and the error is raised when the spine is next
+        asked for more elements than that (so reading ahead in chunks never
+        raises an error early). The spine is then not marked as evaluated, so
+        the elements before the error are never taken for the whole List.
+
+        Returns: False if the tail was already exhausted, and True otherwise
+        """
+        if self.error is None and self.is_evaluated:
+            return False
+        with self.lock():
+            return self.__next(n)
+
+    def __next(self, n):
+        """
+        Evaluate up to n more elements of the tail (see help(Spine.next)),
+        holding the lock.
+        """
+        if self.error is not None:
+            raise self.error
+        elif self.is_evaluated:
+            return False
+        elif self.retain is not None and n > max(self.retain, self.chunk_size):
+            # evaluate a long way ahead in bounded chunks, dropping the
+            # elements that are not retained between them
+            limit, is_more = max(self.retain, self.chunk_size), False
+            while n > 0 and self.error is None and not self.is_evaluated:
+                is_more = self.__next(min(n, limit)) or is_more
+                n -= limit
+            return is_more
+        elif self.retain is not None and len(self.head) >= 2 * self.retain:
+            # drop the elements from before this call that are not retained
+            self.dropped += len(self.head) - self.retain
+            del self.head[:-self.retain]
+
+        chunk = []
+        try:
+            chunk.extend(itertools.islice(self.tail, n))
+        except Exception as e:
+            self.error = e
+
+        try:
+            self.check(chunk)
+        except TypeError as e:
+            self.error = e
+
+        # the new elements must be in the head before the tail is finished
+        self.head.extend(chunk)
+        if self.error is not None:
+            # the spine is not evaluated: it is only as long as the head so
+            # far, and asking for more of it raises the error
+            self.tail = None
+            self.parts = None
+            self.producer = None
+            if len(chunk) == 0:
+                raise self.error
+        elif len(chunk) < n:
+            self.__finish()
+        return len(chunk) > 0
+
+    def __finish(self):
+        """
+        Mark the tail as exhausted.
+        """
+        self.is_evaluated = True
+        self.tail = None
+        self.parts = None
+        self.producer = None
+        return
+
+    def check(self, items):
+        """
+        Type check a list of new elements against the elements already in the
+        spine (or against the first new element, if the spine is empty). The
+        first element of a spine is also checked against the type of the
+        spine, if it is already known (e.g. it was declared).
+
+        If the elements all have the same type as the first one because they
+        have the same classes (see help(monotype_classes)), they are checked
+        by comparing their classes, the type of the elements is cached, and
+        the head is switched to an array if the elements are ints or floats.
+        Otherwise each element is unified with the first one.
+
+        Raises:
+            TypeError, if an element does not type check, after cutting the
+            list of new elements short before it
+        """
+        if len(items) == 0:
+            return
+
+        is_first = self.end() == 0 and len(self.front) == 0
+        first = items[0] if is_first else \
+                self.head[0] if len(self.head) > 0 else self.front[0]
+
+        if is_first and self.type is not None:
+            try:
+                unify(self.type, ListType(typeof(first)))
+            except TypeError:
+                del items[:]
+                raise
+
+        classes = monotype_classes(first)
+        if classes is not None and classes.issuperset(map(type, items)):
+            if self.type is None:
+                self.type = ListType(typeof(first))
+            if type(self.head) is list and classes in __array_typecodes__:
+                typecode = __array_typecodes__[classes]
+                self.head = array.array(typecode, self.head)
+            return
+
+        first_type = typeof(first)
+        for i, item in enumerate(items):
+            try:
+                unify(first_type, typeof(item))
+            except TypeError:
+                del items[i:]
+                raise
+        return
+
+    def checked(self, head, tail):
+        """
+        Iterate over the evaluated elements of a claimed spine (head) and then
+        over its claimed tail, without adding them to the spine. The tail is
+        evaluated in chunks that double in size, like iter_from does, and its
+        elements are type checked the way adding them to the spine would be
+        (see help(Spine.check)). An error is raised when the iteration
+        reaches it.
+        """
+        return itertools.chain.from_iterable(self.__checked(head, tail))
+
+    def __checked(self, head, tail):
+        """
+        Iterate over the head and the type checked chunks of a claimed tail
+        (see help(Spine.checked)).
+        """
+        yield head
+        first = head[:1]
+        classes = monotype_classes(first[0]) if len(first) > 0 else None
+        n = 1
+        while True:
+            chunk, error = [], None
             try:
-                next_iter = next(self.__tail)
-                if len(self.__head) > 0:
-                    unify(typeof(self[0]), typeof(next_iter))
-                self.__head.append(next_iter)
-            except StopIteration as si:
-                self.__is_evaluated = True
+                chunk.extend(itertools.islice(tail, n))
+            except Exception as e:
+                error = e
+
+            if len(first) == 0 and len(chunk) > 0:
+                first = chunk[:1]
+                classes = monotype_classes(first[0])
+                if self.type is not None:
+                    try:
+                        unify(self.type, ListType(typeof(first[0])))
+                    except TypeError as e:
+                        del chunk[:]
+                        error = e
+
+            if len(chunk) > 0 and (classes is None or
+                                   not classes.issuperset(map(type, chunk))):
+                first_type = typeof(first[0])
+                for i, item in enumerate(chunk):
+                    try:
+                        unify(first_type, typeof(item))
+                    except TypeError as e:
+                        del chunk[i:]
+                        error = e
+                        break
+
+            yield chunk
+            if error is not None:
+                raise error
+            elif len(chunk) < n:
+                return
+            n = min(n * 2, self.chunk_size)
+
+    def claim(self):
+        """
+        Take over the evaluation of the tail of a spine that has a producer:
+        the caller iterates over the rest of the elements without adding them
+        to the spine, and the spine's tail is replaced by one that computes
+        them afresh with the producer, in case the spine is evaluated further
+        after all. A spine is only claimed once, so its elements are computed
+        at most twice.
+
+        Returns: a copy of the evaluated elements and the claimed tail, or
+        None if the spine has no producer (or has had elements consed onto it
+        or dropped from it, or has failed)
+        """
+        with self.lock():
+            producer, self.producer = self.producer, None
+            if producer is None or self.is_evaluated or \
+               self.error is not None or self.dropped > 0 or \
+               len(self.front) > 0:
+                return None
+            head, tail = self.head[:], self.tail
+            self.tail = Spine.__resume(producer, len(head))
+        return head, tail
+
+    @staticmethod
+    def __resume(producer, i):
+        """
+        Iterate over the elements of a claimed spine from position i on, by
+        running its producer again.
+        """
+        for item in itertools.islice(producer(), i, None):
+            yield item
+
+    def end(self):
+        """
+        The position after the last evaluated element.
+        """
+        return self.dropped + len(self.head)
+
+    def force(self, n):
+        """
+        Evaluate the tail until the head reaches position n (or the tail is
+        exhausted).
+        """
+        if self.end() < n:
+            with self.lock():
+                # another thread may have evaluated the tail in the meantime
+                if self.end() < n:
+                    self.__next(n - self.end())
         return
 
-    def __evaluate(self):
+    def has(self, i, n=1):
         """
-        Evaluate the entire List.
+        Whether the spine has an element at position i, evaluating the tail up
+        to it (and up to n elements, if that is more) if the head does not
+        reach it yet.
         """
-        while not self.__is_evaluated:
-            self.__next()
+        if self.end() > i:
+            return True
+        with self.lock():
+            if self.end() <= i:
+                self.__next(max(n, i + 1 - self.end()))
+            return self.end() > i
+
+    def evaluate(self):
+        """
+        Evaluate the entire tail.
+        """
+        while self.next(self.chunk_size):
+            pass
         return
 
+    def get(self, i):
+        """
+        The (evaluated) element at position i.
+        """
+        if i < 0:
+            return self.front[-i - 1]
+        elif i < self.dropped:
+            raise EvictedError("List element %d is no longer retained" % i)
+        return self.head[i - self.dropped]
+
+    def evaluated(self, i, j=None):
+        """
+        The evaluated elements from position i up to (but not including)
+        position j, or up to the end of the head if j is None.
+        """
+        j = self.end() if j is None else min(j, self.end())
+        d = self.dropped
+        if j <= i:
+            return []
+        elif max(i, 0) < d and j > 0:
+            raise EvictedError("List element %d is no longer retained" %
+                               max(i, 0))
+        elif i >= 0:
+            return self.head[i - d:j - d]
+        front = self.front[-i - 1:-j - 1 if j < 0 else None:-1]
+        if j <= 0:
+            return front
+        elif isinstance(self.head, array.array):
+            front = array.array(self.head.typecode, front)
+        return front + self.head[:j - d]
+
+    def cons(self, i, item):
+        """
+        Add an item in front of position i.
+
+        Returns: the spine and position of the new element. This is this spine
+        if i is the front of the spine (or the same item was already consed on
+        at i), and a new spine that copies the evaluated part otherwise.
+        """
+        with self.lock():
+            if i == -len(self.front):
+                self.front.append(item)
+                return self, i - 1
+            elif i <= 0 and self.front[-i] is item:
+                return self, i - 1
+            elif self.dropped < i <= self.end() and \
+                 self.head[i - 1 - self.dropped] is item:
+                return self, i - 1
+
+        # the copy continues from position i if the head does not reach it
+        end = self.end()
+        spine = Spine(self.evaluated(i, end), retain=self.retain)
+        spine.front.append(item)
+        if not self.is_evaluated:
+            spine.tail = self.iter_from(max(i, end))
+            spine.is_evaluated = False
+        return spine, -1
+
+    def iter_from(self, i):
+        """
+        Iterate over the elements of the spine, starting at position i.
+
+        The tail is evaluated in chunks that double in size (up to chunk_size)
+        as the iteration goes on, so iterating evaluates at most twice as many
+        elements as it uses.
+        """
+        front = self.front
+        while i < 0:
+            yield front[-i - 1]
+            i += 1
+
+        chunk = 1
+        while True:
+            # the head may have been replaced by an array
+            head, j = self.head, i - self.dropped
+            if 0 <= j < len(head):
+                yield head[j]
+                i += 1
+            elif j < 0:
+                self.get(i)
+            elif not self.has(i, chunk):
+                return
+            else:
+                chunk = min(chunk * 2, self.chunk_size)
+
+
+class List(collections.Sequence, Hask):
+    """
+    Statically typed lazy sequence datatype.
+
+    The type of the elements can be declared with element_type, an argument
+    of a type signature (e.g. int, t(Maybe, str), or [int]). The type of a
+    List with a declared element type is known without evaluating any of its
+    elements, and its elements are checked against it as they are evaluated.
+
+    A List keeps all of the elements it has evaluated, unless it is given a
+    number of elements to retain (see help(List.retain)).
+
+    See help(L) for more information.
+    """
+    def __init__(self, head=None, tail=None, element_type=None, retain=None):
+        spine = Spine(tail=None if tail is None else iter(tail),
+                      retain=retain)
+        if element_type is not None:
+            spine.type = ListType(build_sig_arg(element_type, {}, {}))
+        if isinstance(tail, (Range, Records)):
+            spine.range = tail
+            if spine.type is None and tail.has(0):
+                spine.type = ListType(typeof(tail.get(0)))
+            if isinstance(tail, Records) and tail.type is None and \
+               spine.type is not None:
+                tail.type = spine.type.types[0]
+        if isinstance(head, array.array) and \
+           head.typecode in __array_typecodes__.values():
+            # the elements of an array all have the same class, so only the
+            # first one needs to be checked, and they can be copied in bulk
+            spine.check(head[:1])
+            spine.head.extend(head)
+        elif head is not None:
+            head = list(head)
+            spine.check(head)
+            spine.head.extend(head)
+        self.__spine = spine
+        self.__start = 0
+        return
+
+    @staticmethod
+    def __view(spine, start=0):
+        """
+        Create a List that shares the given spine, starting at position
+        `start`.
+        """
+        view = List.__new__(List)
+        view.__spine = spine
+        view.__start = start
+        return view
+
+    def __range(self):
+        """
+        The Range or Records of the elements of the List, if the List is (a
+        suffix of) an arithmetic sequence or the records of a file, and None
+        otherwise.
+        """
+        spine, start = self.__spine, self.__start
+        if spine.range is None or start < 0:
+            return None
+        elif start == 0:
+            return spine.range
+        return spine.range.slice(slice(start, None))
+
+    def __evaluated(self):
+        """
+        The elements of the List that have been evaluated so far.
+        """
+        if self.__start == 0 and self.__spine.dropped == 0:
+            return self.__spine.head
+        return self.__spine.evaluated(self.__start)
+
+    @staticmethod
+    def __concat(lists):
+        """
+        Iterate over the elements of a sequence of Lists. Lists that are
+        unevaluated concatenations themselves are replaced by their parts,
+        using an explicit stack, so that the elements of deeply nested
+        concatenations are not passed up through a chain of nested iterators.
+        """
+        stack = [iter(lists)]
+        while stack:
+            for xs in stack[-1]:
+                if not isinstance(xs, List):
+                    for x in xs:
+                        yield x
+                    continue
+
+                spine, start = xs.__spine, xs.__start
+                if spine.parts is not None and start == 0 and \
+                   spine.end() == 0 and len(spine.front) == 0:
+                    stack.append(iter(spine.parts))
+                    break
+
+                for x in xs:
+                    yield x
+            else:
+                stack.pop()
+
+    def __type__(self):
+        spine, start = self.__spine, self.__start
+        if spine.type is not None and (start <= 0 or start < spine.end() or
+                                       not spine.is_evaluated):
+            return spine.type
+
+        spine.force(start + 1)
+        if spine.end() <= start:
+            return ListType(TypeVariable())
+        return ListType(typeof(spine.get(start)))
+
+    def is_evaluated(self):
+        """
+        Whether all of the elements of the List have been evaluated, so that
+        e.g. hashing or comparing it does not evaluate any more of it.
+        """
+        return self.__spine.is_evaluated
+
+    def retain(self, k):
+        """
+        Limit the elements that the List keeps once they are evaluated to (at
+        least) the last k elements evaluated, so that the memory used by a long
+        or infinite List stays bounded as it is traversed. This applies to the
+        List and to every List that shares its elements (e.g. its suffixes).
+
+        Asking for an element that is no longer retained (e.g. indexing before
+        the window, or showing the List) raises an EvictedError.
+
+        >>> xs = iterate(__+1, 0).retain(100)
+
+        Args:
+            k: the number of elements to retain
+
+        Returns: the List
+        """
+        if k < 1:
+            raise ValueError("A List must retain at least one element")
+        self.__spine.retain = k
+        return self
+
+    def fusible(self, producer):
+        """
+        Keep a function that iterates over the elements of the List afresh,
+        so that another function that iterates over the List only once can
+        claim its evaluation (see help(List.elements)). This is only done
+        for a List that nothing has evaluated or shared yet.
+
+        Args:
+            producer: a function with no arguments that returns an iterator
+                      over the elements of the List
+
+        Returns: the List
+        """
+        spine = self.__spine
+        with spine.lock():
+            if self.__start == 0 and spine.end() == 0 and \
+               len(spine.front) == 0 and not spine.is_evaluated:
+                spine.producer = producer
+        return self
+
+    def elements(self):
+        """
+        The elements of the List, for a single pass over them. If the List has
+        a producer (see help(List.fusible)) and has not been claimed yet, the
+        elements that it has not evaluated yet are computed by the pass, type
+        checked but not kept in the List. Otherwise this is the List itself.
+
+        Returns: an iterable
+        """
+        spine = self.__spine
+        claimed = spine.claim() if self.__start == 0 else None
+        if claimed is None:
+            return self
+        return spine.checked(*claimed)
+
+    def prefetch(self, depth):
+        """
+        Evaluate the rest of the List ahead of time in a background thread,
+        keeping up to `depth` elements ready, so that producing the elements
+        (e.g. reading them from a file or a socket) overlaps with using them.
+        This applies to the List and to every List that shares its elements.
+
+        The elements are still evaluated in order and type checked as they are
+        added to the List, an error raised while evaluating them is raised
+        when the List reaches it, and the thread stops once the List is no
+        longer referenced. Arithmetic sequences and the records of files are
+        left as they are, since their elements are computed where they are
+        used.
+
+        >>> lines = L[str][open("huge.log")].prefetch(1000)
+
+        Args:
+            depth: the number of elements to evaluate ahead of time
+
+        Returns: the List
+        """
+        if depth < 1:
+            raise ValueError("A List must prefetch at least one element")
+
+        spine = self.__spine
+        with spine.lock():
+            # the elements of a Range or Records are computed where they are
+            # used, without going through the tail
+            if spine.range is None and not spine.is_evaluated and \
+               spine.error is None:
+                spine.tail = Prefetcher(spine.tail, depth)
+                spine.producer = None
+        return self
+
+    def __assume_type__(self, list_type):
+        """
+        Take the expected type of the List (e.g. the return type of a TypedFunc
+        that returned it) as its type, instead of evaluating its first element
+        to find its type. This is only done if none of the List's elements have
+        been evaluated yet, and the type of the elements is fully known.
+
+        If the expected type of the elements is a type variable with no
+        constraints (e.g. the result of mapping a section such as (__*2),
+        whose type is a -> b), any type of elements matches it, so the List
+        is taken to have the expected type without learning its own.
+        """
+        spine, list_type = self.__spine, prune(list_type)
+        if spine.type is not None or spine.is_evaluated or \
+           self.__start != 0 or spine.end() > 0 or len(spine.front) > 0:
+            return False
+        elif isinstance(list_type, TypeVariable) or len(list_type.types) != 1:
+            return False
+
+        element_type = prune(list_type.types[0])
+        if isinstance(element_type, TypeVariable) and \
+           not element_type.constraints:
+            return True
+        elif not isGround(element_type):
+            return False
+
+        # the expected type may be a higher-kinded type such as `f a`
+        spine_type = ListType(list_type.types[0])
+        unify(list_type, spine_type)
+        spine.type = spine_type
+        return True
+
     def __rxor__(self, item):
         """
         ^ is the cons operator (equivalent to : in Haskell)
         """
         unify(self.__type__(), ListType(typeof(item)))
-        if self.__is_evaluated:
-            return List(head=[item] + self.__head)
-        return List(head=[item] + self.__head, tail=self.__tail)
+        return List.__view(*self.__spine.cons(self.__start, item))
 
     def __add__(self, other):
         """
@@ -227,65 +1349,115 @@ class List(collections.Sequence, Hask):
         + is the list concatenation operator, equivalent to ++ in Haskell and +
         for Python lists
         """
-        unify(self.__type__(), typeof(other))
-        if self.__is_evaluated and other.__is_evaluated:
-            return List(head=self.__head + other.__head)
-        elif self.__is_evaluated and not other.__is_evaluated:
-            return List(head=self.__head + other.__head,
-                        tail=other.__tail)
-        return List(head=self.__head,
-                    tail=itertools.chain(self.__tail, iter(other)))
+        list_type = self.__type__()
+        unify(list_type, typeof(other))
+
+        # build a lazy append node that shares both Lists
+        spine = Spine(tail=List.__concat((self, other)))
+        spine.parts = (self, other)
+        spine.type = list_type
+        return List.__view(spine)
+
+    @staticmethod
+    def __known_length(lists):
+        """
+        The number of elements at the start of a concatenation of Lists that
+        are already evaluated in its parts, i.e. that can be evaluated without
+        evaluating any of the lazy tails of its parts.
+
+        Returns: the number of elements, and whether they are all of the
+        elements in the concatenation
+        """
+        stack, length = [iter(lists)], 0
+        while stack:
+            for xs in stack[-1]:
+                if not isinstance(xs, List):
+                    return length, False
+
+                spine, start = xs.__spine, xs.__start
+                if spine.parts is not None and start == 0 and \
+                   spine.end() == 0 and len(spine.front) == 0:
+                    stack.append(iter(spine.parts))
+                    break
+
+                length += len(xs.__evaluated())
+                if not spine.is_evaluated:
+                    return length, False
+            else:
+                stack.pop()
+        return length, True
 
     def __str__(self):
-        if len(self.__head) == 0 and self.__is_evaluated:
+        # show the parts of concatenations that are already evaluated, and
+        # at least the first element of the List
+        length = self.__start
+        if self.__spine.parts is not None:
+            length, is_finite = List.__known_length(self.__spine.parts)
+            if is_finite:
+                self.__spine.evaluate()
+            length = max(length, self.__start)
+        self.__spine.force(length + 1)
+
+        head = self.__evaluated()
+        if len(head) == 0 and self.__spine.is_evaluated:
             return "L[[]]"
 
-        elif len(self.__head) == 1 and self.__is_evaluated:
-            return "L[[%s]]" % show(self.__head[0])
+        elif len(head) == 1 and self.__spine.is_evaluated:
+            return "L[[%s]]" % show(head[0])
 
-        body = ", ".join((show(s) for s in self.__head))
-        return "L[%s]" % body if self.__is_evaluated else "L[%s ...]" % body
+        body = ", ".join((show(s) for s in head))
+        return "L[%s]" % body if self.__spine.is_evaluated else \
+               "L[%s ...]" % body
 
-    def __cmp__(self, other):
-        if self.__is_evaluated and other.__is_evaluated:
-            return cmp(self.__head, other.__head)
-
-        elif len(self.__head) >= len(other.__head):
-            # check the evaluated heads
-            heads = zip(self.__head[:len(other.__head)], other.__head)
-            heads_comp = ((cmp(h1, h2) for h1, h2 in heads))
-            for comp in heads_comp:
-                if comp != 0:
-                    return comp
-
-            # evaluate the shorter-headed list until it is the same size
-            while len(self.__head) > len(other.__head):
-                if other.__is_evaluated:
-                    return 1
-                other.__next()
-                comp = cmp(self.__head[len(other.__head)-1], other.__head[-1])
-                if comp != 0:
-                    return comp
-
-            # evaluate the tails, checking each time
-            while not self.__is_evaluated or not other.__is_evaluated:
-                if not self.__is_evaluated:
-                    self.__next()
-                if not other.__is_evaluated:
-                    other.__next()
-
-                len_comp = cmp(len(self.__head), len(other.__head))
-                if len_comp != 0:
-                    return len_comp
-
-                if len(self.__head) > 0:
-                    value_comp = cmp(self.__head[-1], other.__head[-1])
-                    if value_comp != 0:
-                        return value_comp
-
-        elif len(other.__head) > len(self.__head):
-            return -other.__cmp__(self)
+    @staticmethod
+    def __native_cmp(xs, ys):
+        """
+        Compare two sequences of evaluated elements (lists or arrays).
+        """
+        if type(xs) is not type(ys):
+            xs, ys = list(xs), list(ys)
+        return cmp(xs, ys)
 
+    def __cmp__(self, other):
+        spine, i = self.__spine, self.__start
+        other_spine, j = other.__spine, other.__start
+        if spine.is_evaluated and other_spine.is_evaluated:
+            return List.__native_cmp(self.__evaluated(), other.__evaluated())
+
+        elif self.__range() is None and other.__range() is None:
+            # compare the elements that are evaluated in both Lists in bulk,
+            # and evaluate more of them (in chunks that double in size, as in
+            # Spine.iter_from) only as long as they are equal
+            chunk = 1
+            while True:
+                n = min(spine.end() - i, other_spine.end() - j)
+                if n > 0:
+                    comp = List.__native_cmp(spine.evaluated(i, i + n),
+                                             other_spine.evaluated(j, j + n))
+                    if comp != 0:
+                        return comp
+                    i, j = i + n, j + n
+                    continue
+
+                is_more = spine.has(i, chunk)
+                is_more_other = other_spine.has(j, chunk)
+                if not is_more or not is_more_other:
+                    return cmp(is_more, is_more_other)
+                chunk = min(chunk * 2, spine.chunk_size)
+
+        # compare element by element, evaluating only as much as necessary
+        others = iter(other)
+        for item in self:
+            try:
+                other_item = next(others)
+            except StopIteration:
+                return 1
+            comp = cmp(item, other_item)
+            if comp != 0:
+                return comp
+
+        for other_item in others:
+            return -1
         return 0
 
     def __eq__(self, other):
@@ -305,42 +1477,182 @@ class List(collections.Sequence, Hask):
         comp = self.__cmp__(other)
         return comp in (1, 0)
 
+    def __hash__(self):
+        # consistent with __eq__, so the List is evaluated, and must be finite
+        # (the elements of a Range or Records are computed, not evaluated
+        # into the spine)
+        elements = self.__range()
+        if elements is not None:
+            if elements.length is None:
+                raise TypeError("An infinite List cannot be hashed")
+            return hash(tuple(elements))
+        self.__spine.evaluate()
+        return hash(tuple(self.__evaluated()))
+
     def __len__(self):
-        self.__evaluate()
-        return len(self.__head)
+        elements = self.__range()
+        if elements is not None and elements.length is not None:
+            return elements.length
+
+        self.__spine.evaluate()
+        return max(0, self.__spine.end() - self.__start)
 
     def __iter__(self):
-        for item in self.__head:
-            yield item
+        # the elements of a Range are computed, not evaluated into the spine
+        elements = self.__range()
+        if elements is not None:
+            return iter(elements)
+        return self.__spine.iter_from(self.__start)
+
+    def __contains__(self, x):
+        elements = self.__range()
+        if elements is not None:
+            found = elements.contains(x)
+            if found is not None:
+                return found
+
+        # scan the evaluated elements in bulk, evaluating more only as needed
+        # (in chunks that double in size, as in Spine.iter_from)
+        spine, i, chunk = self.__spine, self.__start, 1
+        while True:
+            end = spine.end()
+            if x in spine.evaluated(i, end):
+                return True
+            i = max(i, end)
+            if not spine.has(i, chunk):
+                return False
+            chunk = min(chunk * 2, spine.chunk_size)
+
+    def index(self, x):
+        """
+        The position of the first occurrence of x in the List, evaluating the
+        List only as far as that. Raises a ValueError if x is not in the List.
+        """
+        elements = self.__range()
+        i = None if elements is None else elements.position(x)
+        if i is not None:
+            if i >= 0:
+                return i
+            raise ValueError("%r is not in List" % (x,))
+
+        # scan the evaluated elements in bulk, like __contains__
+        spine, i, chunk = self.__spine, self.__start, 1
+        while True:
+            end = spine.end()
+            try:
+                return i - self.__start + spine.evaluated(i, end).index(x)
+            except ValueError:
+                pass
+            i = max(i, end)
+            if not spine.has(i, chunk):
+                raise ValueError("%r is not in List" % (x,))
+            chunk = min(chunk * 2, spine.chunk_size)
+
+    def count(self, x):
+        """
+        The number of occurrences of x in the List, which must be finite.
+        """
+        elements = self.__range()
+        if elements is not None and elements.length is not None:
+            n = elements.count(x)
+            if n is not None:
+                return n
 
-        for item in self.__tail:
-            self.__head.append(item)
-            yield item
+        self.__spine.evaluate()
+        return self.__evaluated().count(x)
 
-    def __getitem__(self, ix):
-        is_slice = isinstance(ix, slice)
-        if is_slice:
-            i = ix.start if ix.stop is None else ix.stop
-        else:
-            i = ix
-
-        # make sure that the list is evaluated enough to do the indexing, but
-        # not any more than necessary
-        # if index is negative, evaluate the entire list
-        if i >= 0:
-            while (i+1) > len(self.__head):
-                try:
-                    self.__next()
-                except StopIteration:
-                    break
-        else:
-            self.__evaluate()
+    def __reversed__(self):
+        elements = self.__range()
+        if elements is not None and elements.length is not None:
+            return iter(elements.slice(slice(None, None, -1)))
+
+        self.__spine.evaluate()
+        return reversed(self.__evaluated())
+
+    def to_array(self, evaluate=True):
+        """
+        Evaluate the entire List, and return a copy of its elements in an
+        array.array, if the List stores them in one (i.e., its elements are
+        ints or floats). Arrays support the buffer protocol, so this hands the
+        elements to other code as a contiguous buffer.
+
+        Args:
+            evaluate: whether to evaluate the List; if False, the elements are
+                      only returned if the List is already fully evaluated
+
+        Returns: an array.array, or None if the elements are not stored in one
+        """
+        spine = self.__spine
+        if isinstance(spine.range, Records):
+            # the records of a file are not kept in the List
+            return None
+        elif evaluate:
+            spine.evaluate()
+        if not isinstance(spine.head, array.array) or not spine.is_evaluated:
+            return None
+        return spine.evaluated(self.__start)
 
-        if is_slice:
-            if ix.stop is None:
-                return List(head=self.__head[ix], tail=self.__tail)
-            return List(head=self.__head[ix])
-        return self.__head[i]
+    def __getitem__(self, ix):
+        spine, start = self.__spine, self.__start
+        elements = self.__range()
+
+        if elements is not None and not isinstance(ix, slice):
+            if ix >= 0:
+                if not elements.has(ix):
+                    raise IndexError("List index out of range")
+                return elements.get(ix)
+            elif elements.length is not None:
+                length = elements.length
+                if ix < -length:
+                    raise IndexError("List index out of range")
+                return elements.get(length + ix)
+
+        if not isinstance(ix, slice):
+            # make sure that the list is evaluated enough to do the indexing,
+            # but not any more than necessary
+            # if index is negative, evaluate the entire list
+            if ix >= 0:
+                spine.force(start + ix + 1)
+                if start + ix >= spine.end():
+                    raise IndexError("List index out of range")
+                return spine.get(start + ix)
+
+            spine.evaluate()
+            if spine.end() + ix < start:
+                raise IndexError("List index out of range")
+            return spine.get(spine.end() + ix)
+
+        lower = 0 if ix.start is None else ix.start
+        step = 1 if ix.step is None else ix.step
+
+        # suffixes (e.g. the tail of the list) share this List's spine
+        if ix.stop is None and step == 1 and lower >= 0:
+            return List.__view(spine, start + lower)
+
+        # slices of arithmetic sequences are arithmetic sequences
+        elements = None if elements is None else elements.slice(ix)
+        if elements is not None:
+            return List(tail=elements)
+
+        # other forward slices evaluate only as far as they need to
+        elif step > 0 and lower >= 0 and ix.stop is None:
+            return List(tail=itertools.islice(iter(self), lower, None, step))
+
+        elif step > 0 and lower >= 0 and ix.stop >= 0:
+            spine.force(start + ix.stop)
+            head = spine.evaluated(start + lower, start + ix.stop)[::step]
+            return List.__view(Spine(head))
+
+        # backward slices evaluate only as far as their start
+        elif step < 0 and ix.start is not None and lower >= 0 and \
+             (ix.stop is None or ix.stop >= 0):
+            spine.force(start + lower + 1)
+            head = spine.evaluated(start, start + lower + 1)[ix]
+            return List.__view(Spine(head))
+
+        # if the slice has negative bounds, evaluate the entire list
+        spine.evaluate()
+        return List.__view(Spine(self.__evaluated()[ix]))
 
 
 ## Basic typeclass instances for list
@@ -359,6 +1671,173 @@ instance(Ord, List).where(
    ge = List.__ge__
 )
 
+
+def __compare_lists(typed_compare, compare):
+    """
+    Replace a comparison operator of List that the Eq or Ord instance wraps
+    in a TypedFunc. Comparing a List with another List only needs their
+    element types to unify, so that is checked directly; comparisons with
+    anything else still go through the typed path (and fail to unify).
+    """
+    def list_compare(self, other):
+        if isinstance(other, List):
+            unify(self.__type__(), other.__type__())
+            return compare(self, other)
+        return typed_compare(self, other)
+    return list_compare
+
+List.__eq__ = __compare_lists(List.__eq__, lambda s, o: s.__cmp__(o) == 0)
+List.__ne__ = __compare_lists(List.__ne__, lambda s, o: s.__cmp__(o) != 0)
+List.__lt__ = __compare_lists(List.__lt__, lambda s, o: s.__cmp__(o) < 0)
+List.__gt__ = __compare_lists(List.__gt__, lambda s, o: s.__cmp__(o) > 0)
+List.__le__ = __compare_lists(List.__le__, lambda s, o: s.__cmp__(o) <= 0)
+List.__ge__ = __compare_lists(List.__ge__, lambda s, o: s.__cmp__(o) >= 0)
+
+
+def records(path, width=None, delimiter="\n", decode=None, element_type=None,
+            copy=True):
+    """
+    A List of the records of a file, which is mapped into memory instead of
+    being read: its records of `width` bytes, or (if width is None) its
+    records separated by a delimiter (by default, its lines), without the
+    delimiters.
+
+    The records are read (and decoded, if decode is not None) when they are
+    used, and are not kept in the List, so files that do not fit in memory
+    can be traversed, and sliced, dropped and taken from without reading the
+    records in between. Once a delimited record has been found, finding it
+    again takes constant time (see help(RecordFile)).
+
+    Args:
+        path: the path of the file
+        width: the size of the records in bytes, or None if the records are
+               separated by the delimiter
+        delimiter: the string that separates the records
+        decode: a function that turns each record into an element of the
+                List, or None for the bytes of the records
+        element_type: the type of the elements (see help(L)); if None, it is
+                      the type of the first element
+        copy: whether the bytes of a record are copied into a str; if False,
+              they are read-only buffers into the mapped file
+
+    >>> records("huge.log")
+    # the lines of a file
+
+    >>> records("samples.bin", width=8,
+    ...         decode=lambda r: struct.unpack("d", r)[0])
+    # the floats in a file of doubles
+    """
+    return List(tail=Records(RecordFile(path, width, delimiter, copy), decode),
+                element_type=element_type)
+
+#=============================================================================#
+# Stream
+
+
+class StreamConsumedError(Exception):
+    pass
+
+
+class Stream(Hask):
+    """
+    Statically typed, single-pass lazy sequence datatype.
+
+    A Stream has the same type as a List of its elements, so it can be passed
+    to any function with a list type in its signature, but it does not keep
+    the elements it has evaluated. It can therefore be traversed only once,
+    and traversing it does not hold on to any of its elements. Traversing a
+    Stream a second time raises a StreamConsumedError.
+
+    The Data.List functions that need only one pass over a list (e.g. map,
+    filter, takeWhile and zip) return a Stream when given one, and folds over
+    a Stream (e.g. foldl, sum and length) run in constant memory.
+
+    The type of the elements can be declared with element_type, as for a
+    List. Otherwise, finding out the type of a Stream evaluates (and buffers)
+    its first element.
+
+    >>> Stream(open("huge.log"), str)
+    # the lines of a file, read only as they are used
+    """
+    def __init__(self, iterable, element_type=None):
+        self.__tail = iter(iterable)
+        self.__first = []
+        self.__type = None if element_type is None else \
+                      ListType(build_sig_arg(element_type, {}, {}))
+        self.__is_consumed = False
+        return
+
+    def __type__(self):
+        if self.__type is not None:
+            return self.__type
+        elif self.__is_consumed or len(self.__first) > 0:
+            return ListType(TypeVariable())
+
+        # buffer the first element until the Stream is traversed
+        for item in self.__tail:
+            self.__first.append(item)
+            self.__type = ListType(typeof(item))
+            return self.__type
+        return ListType(TypeVariable())
+
+    def __assume_type__(self, list_type):
+        """
+        Take the expected type of the Stream as its type, under the same
+        conditions as a List (see help(List.__assume_type__)).
+        """
+        list_type = prune(list_type)
+        if self.__type is not None or self.__is_consumed:
+            return False
+        elif isinstance(list_type, TypeVariable) or len(list_type.types) != 1:
+            return False
+
+        element_type = prune(list_type.types[0])
+        if isinstance(element_type, TypeVariable) and \
+           not element_type.constraints:
+            return True
+        elif not isGround(element_type):
+            return False
+
+        self.__type = ListType(list_type.types[0])
+        unify(list_type, self.__type)
+        return True
+
+    def __iter__(self):
+        return self.__traverse()
+
+    def __traverse(self):
+        """
+        Iterate over the elements of the Stream, type checking each one
+        against the first.
+
+        The error for a second traversal is raised by the iterator rather than
+        by __iter__, because builtins such as reduce replace errors raised by
+        __iter__ with their own.
+        """
+        if self.__is_consumed:
+            raise StreamConsumedError("Stream has already been traversed")
+        self.__is_consumed = True
+
+        buffered, self.__first = self.__first, []
+        items = itertools.chain(buffered, self.__tail)
+        for first in items:
+            break
+        else:
+            return
+
+        if self.__type is None:
+            self.__type = ListType(typeof(first))
+        else:
+            unify(self.__type, ListType(typeof(first)))
+        yield first
+
+        first_type, classes = typeof(first), monotype_classes(first)
+        for item in items:
+            if classes is None or type(item) not in classes:
+                unify(first_type, typeof(item))
+            yield item
+
+
 #=============================================================================#
 # List comprehension syntax
 
@@ -383,8 +1862,62 @@ class __list_comprehension__(Syntax):
 
     >>> L[1, 5, ..., 20]
     # list from 1 to 20 (inclusive), counting by fours
+
+    The type of the elements of a List can be declared by indexing L with it
+    first, so that the type of the List is known without evaluating any of
+    its elements:
+
+    >>> L[int][(read_number(line) for line in lines)]
+    # lazy list of ints
+
+    >>> L[t(Maybe, int)][[Just(1), Nothing]]
+    # list of Maybe ints
+
+    >>> L[L[int]][[L[1, 2], L[3, 4]]]
+    # list of lists of ints
+
+    Typed functions such as map and filter give the Lists they return the
+    element type of their signature, so a pipeline over a List with a declared
+    type is not evaluated before its result is used, as long as the functions
+    in it have fully known types (e.g. filter, or map with a typed lambda).
+    Sections such as (__*2) are typed a -> b, so the List returned by mapping
+    one over a List has no known element type. It is not evaluated by the
+    call, but its first element is evaluated once it is passed to another
+    typed function, which needs its type.
     """
+    __slots__ = ("element_type",)
+
+    def __init__(self, err_msg, element_type=None):
+        self.element_type = element_type
+        super(__list_comprehension__, self).__init__(err_msg)
+        return
+
+    @staticmethod
+    def __is_type(lst):
+        """
+        Test whether L is being indexed with a type rather than with elements.
+        """
+        return isinstance(lst, (type, TypeSignatureHKT, __signature__)) or \
+               (isinstance(lst, __list_comprehension__) and
+                lst.element_type is not None)
+
     def __getitem__(self, lst):
+        element_type = self.element_type
+        if element_type is None and self.__is_type(lst):
+            if isinstance(lst, __signature__):
+                lst = lst.sig
+            elif isinstance(lst, __list_comprehension__):
+                lst = [lst.element_type]
+            return __list_comprehension__("Invalid input to list constructor",
+                                          lst)
+
+        elif element_type is not None and isinstance(lst, tuple) and \
+                any((Ellipsis is x for x in lst)):
+            xs = __list_comprehension__("Invalid input to list constructor")
+            xs = xs[lst]
+            unify(ListType(build_sig_arg(element_type, {}, {})), typeof(xs))
+            return xs
+
         if isinstance(lst, tuple) and len(lst) < 5 and \
                 any((Ellipsis is x for x in lst)):
             # L[x, ...]
@@ -405,10 +1938,11 @@ class __list_comprehension__(Syntax):
 
             raise SyntaxError("Invalid list comprehension: %s" % str(lst))
 
-        elif hasattr(lst, "next") or hasattr(lst, "__next__"):
-            return List(tail=lst)
+        elif hasattr(lst, "next") or hasattr(lst, "__next__") or \
+             isinstance(lst, Records):
+            return List(tail=lst, element_type=element_type)
 
-        return List(head=lst)
+        return List(head=lst, element_type=element_type)
 
 
 L = __list_comprehension__("Invalid input to list constructor")
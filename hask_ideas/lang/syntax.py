@@ -1,7 +1,9 @@
 import inspect
 import operator
 import string
-from collections import deque, defaultdict
+import threading
+import weakref
+from collections import defaultdict
 
 from type_system import typeof
 from type_system import Typeclass
@@ -9,12 +11,14 @@ from type_system import TypedFunc
 from type_system import TypeSignature
 from type_system import TypeSignatureHKT
 from type_system import ADT
+from type_system import nt_to_tuple
 from type_system import build_ADT
 from type_system import build_sig
 from type_system import make_fn_type
 from type_system import PatternMatchBind
 from type_system import PatternMatchListBind
 from type_system import pattern_match
+from type_system import compile_pattern
 from type_system import Undefined
 from type_system import PyFunc
 
@@ -58,10 +62,22 @@ class Syntax(object):
 
     Subclasses may override these methods to define what syntax is valid for
     those objects.
+
+    Syntax objects are created constantly (every line of a caseof or guard
+    expression is one), so subclasses use __slots__, and the SyntaxError is
+    only created when it is raised.
     """
+    __slots__ = ("__syntax_err_msg",)
+
     def __init__(self, err_msg):
         self.__syntax_err_msg = err_msg
-        self.invalid_syntax = SyntaxError(self.__syntax_err_msg)
+
+    @property
+    def invalid_syntax(self):
+        try:
+            return SyntaxError(self.__syntax_err_msg)
+        except AttributeError:
+            return SyntaxError("Syntax error")
 
     def __raise(self):
         raise self.invalid_syntax
@@ -86,6 +102,8 @@ class instance(Syntax):
         fmap = ...
     )
     """
+    __slots__ = ("typeclass", "cls")
+
     def __init__(self, typecls, cls):
         if not (inspect.isclass(typecls) and issubclass(typecls, Typeclass)):
             raise TypeError("%s is not a typeclass" % typecls)
@@ -117,6 +135,8 @@ class __constraints__(Syntax):
 
     See help(sig) for more information on type signature decorators.
     """
+    __slots__ = ("constraints",)
+
     def __init__(self, constraints=()):
         self.constraints = defaultdict(lambda: [])
         if len(constraints) > 0:
@@ -154,6 +174,8 @@ class __signature__(Syntax):
     """
     Class that represents a (complete or incomplete) type signature.
     """
+    __slots__ = ("sig",)
+
     def __init__(self, args, constraints):
         self.sig = TypeSignature(args, constraints)
         super(__signature__, self).__init__("Syntax error in type signature")
@@ -189,6 +211,8 @@ class sig(Syntax):
     def to_str(x):
         return str(x)
     """
+    __slots__ = ("sig",)
+
     def __init__(self, signature):
         super(self.__class__, self).__init__("Syntax error in type signature")
 
@@ -266,8 +290,9 @@ undefined = __undefined__()
 # Pattern matching
 
 # Constructs for pattern matching.
-# Note that the approach implemented here uses lots of global state and is
-# pretty much the opposite of "functional" or "thread-safe."
+# Note that the approach implemented here relies on global state: each thread
+# has a stack of the case expressions it is currently evaluating, which `m`
+# and `p` use to find the value being matched and the variables bound so far.
 
 class IncompletePatternError(Exception):
     pass
@@ -282,32 +307,65 @@ class MatchStackFrame(object):
 
 
 class MatchStack(object):
-    """Stack for storing locally bound variables from matches"""
-    __stack__ = deque()
+    """
+    Stack for storing locally bound variables from matches.
+
+    Each thread has its own stack. The stack only holds weak references to its
+    frames, and the case expression that pushed a frame holds the frame itself,
+    so a frame is discarded as soon as its case expression goes away, even if
+    an exception is raised before the expression is finished.
+    """
+    __local__ = threading.local()
+
+    @classmethod
+    def get_stack(cls):
+        """Access the stack for the current thread"""
+        try:
+            return cls.__local__.stack
+        except AttributeError:
+            cls.__local__.stack = []
+            return cls.__local__.stack
 
     @classmethod
     def push(cls, value):
-        """Push a new frame onto the stack, representing a new case expr"""
-        cls.__stack__.append(MatchStackFrame(value))
-        return
+        """
+        Push a new frame onto the stack, representing a new case expr. The
+        frame stays on the stack for as long as the caller holds on to it.
+        """
+        stack = cls.get_stack()
+
+        def discard(ref):
+            for i in xrange(len(stack) - 1, -1, -1):
+                if stack[i] is ref:
+                    del stack[i]
+                    return
+
+        frame = MatchStackFrame(value)
+        stack.append(weakref.ref(frame, discard))
+        return frame
 
     @classmethod
-    def pop(cls):
-        """Pop the current frame off the stack"""
-        cls.__stack__.pop()
+    def pop(cls, frame):
+        """Pop a frame (and anything left above it) off the stack"""
+        stack = cls.get_stack()
+        for i in xrange(len(stack) - 1, -1, -1):
+            if stack[i]() is frame:
+                del stack[i:]
+                return
         return
 
     @classmethod
     def get_frame(cls):
         """Access the current frame"""
-        return cls.__stack__[-1]
+        return cls.get_stack()[-1]()
 
     @classmethod
     def get_name(cls, name):
         """Lookup a variable name in the current frame"""
-        if cls.get_frame().matched:
+        frame = cls.get_frame()
+        if frame.matched:
             return undefined
-        return cls.get_frame().cache.get(name, undefined)
+        return frame.cache.get(name, undefined)
 
 
 class __var_bind__(Syntax):
@@ -343,6 +401,8 @@ class __pattern_bind_list__(Syntax, PatternMatchListBind):
     Class that represents a pattern designed to match an iterable, consisting
     of a head (one element) and a tail (zero to many elements).
     """
+    __slots__ = ()
+
     def __init__(self, head, tail):
         self.head = [head]
         self.tail = tail
@@ -358,6 +418,8 @@ class __pattern_bind__(Syntax, PatternMatchBind):
     Class that represents a pattern designed to match any value and bind it to
     a name.
     """
+    __slots__ = ()
+
     def __init__(self, name):
         self.name = name
         super(__pattern_bind__, self).__init__("Syntax error in match")
@@ -381,6 +443,8 @@ class __match_line__(Syntax):
     This class represents one line of a caseof expression, i.e.:
     m( ... ) >> return_value
     """
+    __slots__ = ("is_match", "return_value")
+
     def __init__(self, is_match, return_value):
         self.is_match = is_match
         self.return_value = return_value
@@ -392,6 +456,8 @@ class __match_test__(Syntax):
     This class represents the pattern part of one caseof line, i.e.:
     m( ... )
     """
+    __slots__ = ("is_match",)
+
     def __init__(self, is_match):
         self.is_match = is_match
         return
@@ -406,16 +472,17 @@ class __unmatched_case__(Syntax):
     This class represents a caseof expression in mid-evaluation, when zero or
     more lines have been tested, but before a match has been found.
     """
+    __slots__ = ("frame",)
+
     def __or__(self, line):
         if line.is_match:
-            MatchStack.get_frame().matched = True
-            return __matched_case__(line.return_value)
+            self.frame.matched = True
+            return __matched_case__(line.return_value, self.frame)
         return self
 
     def __invert__(self):
-        value = MatchStack.get_frame().value
-        MatchStack.pop()
-        raise IncompletePatternError(value)
+        MatchStack.pop(self.frame)
+        raise IncompletePatternError(self.frame.value)
 
 
 class __matched_case__(Syntax):
@@ -423,15 +490,18 @@ class __matched_case__(Syntax):
     This class represents a caseof expression in mid-evaluation, when one or
     more lines have been tested and after a match has been found.
     """
-    def __init__(self, return_value):
+    __slots__ = ("value", "frame")
+
+    def __init__(self, return_value, frame):
         self.value = return_value
+        self.frame = frame
         return
 
     def __or__(self, line):
         return self
 
     def __invert__(self):
-        MatchStack.pop()
+        MatchStack.pop(self.frame)
         return self.value
 
 
@@ -454,13 +524,182 @@ class caseof(__unmatched_case__):
                     | m(0)   >> 1
                     | m(1)   >> 1
                     | m(m.n) >> fib(p.n - 1) + fib(p.n - 2))
+
+    A caseof expression builds all of its patterns and return values every
+    time it is evaluated. caseof.compile builds the patterns once, into a
+    reusable matcher that dispatches on the data constructor or literal value
+    being matched. Each alternative is a (pattern, function) pair, and only
+    the function of the matching alternative is called, with the bound
+    variables as keyword arguments:
+
+    fib_case = caseof.compile(
+        (0,   lambda: 1),
+        (1,   lambda: 1),
+        (m.n, lambda n: fib(n - 1) + fib(n - 2)))
+
+    def fib(x):
+        return fib_case(x)
     """
+    __slots__ = ()
+
     def __init__(self, value):
-        if isinstance(value, Undefined):
+        self.frame = MatchStack.push(value)
+        return
+
+    @classmethod
+    def compile(cls, *alternatives):
+        return __compiled_case__(alternatives)
+
+
+class __compiled_case__(Syntax):
+    """
+    A caseof expression compiled into a decision tree: a dict from data
+    constructors to the alternatives that can match them, and a dict from
+    literal types and values to the alternatives that can match them.
+    Alternatives that can match anything (variables, cons and tuple patterns)
+    are kept in every branch, in their original order.
+
+    Alternatives may also have patterns for additional values (see
+    help(equations)). Only the first pattern is used to build the tree, and
+    the others are tested in order once the first one has matched.
+
+    See help(caseof) for usage.
+    """
+    __slots__ = ("constructors", "literals", "default")
+
+    def __init__(self, alternatives):
+        super(__compiled_case__, self).__init__("Syntax error in caseof")
+        self.constructors = {}
+        self.literals = {}
+        self.default = []
+
+        for alternative in alternatives:
+            if not isinstance(alternative, tuple) or len(alternative) != 2 \
+               or not callable(alternative[1]):
+                raise SyntaxError("Expected (pattern, function), found %s" %
+                                  str(alternative))
+            self.add(*alternative)
+        return
+
+    def add(self, pattern, body, rest=()):
+        """
+        Add an alternative to the end of the tree.
+
+        Args:
+            pattern: the pattern used to match the first value
+            body: the function called with the bound variables if the
+                  alternative matches
+            rest: patterns used to match any additional values
+        """
+        names = set()
+        match = compile_pattern(pattern, names)
+        rest = tuple(compile_pattern(p, names) for p in rest)
+
+        if isinstance(pattern, ADT):
+            matches = self.constructors.setdefault(type(pattern),
+                                                   list(self.default))
+            nullary = len(nt_to_tuple(pattern)) == 0
+            matches.append((None if nullary else match, rest, body))
             return
-        MatchStack.push(value)
+
+        elif not isinstance(pattern, (PatternMatchBind, PatternMatchListBind))\
+             and not hasattr(pattern, "__iter__"):
+            try:
+                values = self.literals.setdefault(type(pattern), {})
+                matches = values.setdefault(pattern, list(self.default))
+                matches.append((None, rest, body))
+                return
+            except TypeError:
+                pass
+
+        # patterns that can match any value are tested in every branch
+        alternative = (match, rest, body)
+        self.default.append(alternative)
+        for matches in self.constructors.values():
+            matches.append(alternative)
+        for values in self.literals.values():
+            for matches in values.values():
+                matches.append(alternative)
         return
 
+    def __call__(self, value, *others):
+        cls = type(value)
+        matches = self.constructors.get(cls)
+        if matches is None:
+            values = self.literals.get(cls)
+            matches = self.default if values is None else \
+                      values.get(value, self.default)
+
+        for match, rest, body in matches:
+            env = {}
+            if match is not None and not match(value, env):
+                continue
+            for match, other in zip(rest, others):
+                if not match(other, env):
+                    break
+            else:
+                return body(**env)
+        raise IncompletePatternError(value)
+
+
+class equations(TypedFunc):
+    """
+    A statically typed function defined by a series of equations, one per
+    clause. Each clause has one pattern per argument, and a function whose
+    arguments are the variables bound by those patterns. Clauses are tried in
+    the order in which they are defined, and are compiled into a table indexed
+    by the data constructor or literal value of the first argument, so calling
+    the function costs one lookup plus the clauses that can actually match.
+
+    Each clause decorator returns the function itself, so every clause can
+    share the function's name.
+
+    Example usage:
+
+    fib = equations(H/ int >> int)
+
+    @fib.eq(0)
+    def fib():
+        return 1
+
+    @fib.eq(1)
+    def fib():
+        return 1
+
+    @fib.eq(m.n)
+    def fib(n):
+        return fib(n - 1) + fib(n - 2)
+    """
+    def __init__(self, signature):
+        if not isinstance(signature, __signature__):
+            msg = "Signature expected in equations(); found %s" % signature
+            raise SyntaxError(msg)
+
+        elif len(signature.sig.args) < 2:
+            raise SyntaxError("Not enough type arguments in signature")
+
+        fn_args = build_sig(signature.sig)
+        super(equations, self).__init__(__compiled_case__(()), fn_args,
+                                        make_fn_type(fn_args))
+        self.__doc__ = None
+        return
+
+    def eq(self, *patterns):
+        """
+        Decorator that adds a clause to the function. There must be one
+        pattern for each argument of the function.
+        """
+        if len(patterns) != len(self.fn_args) - 1:
+            raise SyntaxError("Expected %d patterns in equation, found %d" %
+                              (len(self.fn_args) - 1, len(patterns)))
+
+        def add_clause(body):
+            self.func.add(patterns[0], body, patterns[1:])
+            if self.__doc__ is None:
+                self.__doc__ = body.__doc__
+            return self
+        return add_clause
+
 
 #=============================================================================#
 # ADT creation syntax ("data" expressions)
@@ -490,6 +729,8 @@ class __new_tcon__(Syntax):
     """
     Base class for Syntax classes related to creating new type constructors.
     """
+    __slots__ = ("name", "args")
+
     def __init__(self, name, args=()):
         self.name = name
         self.args = args
@@ -518,6 +759,8 @@ class __new_tcon_enum__(__new_tcon__):
     data.Either
     data.Ordering
     """
+    __slots__ = ()
+
     def __call__(self, *typeargs):
         if len(typeargs) < 1:
             msg = "Missing type args in statement: `data.%s()`" % self.name
@@ -550,7 +793,7 @@ class __new_tcon_hkt__(__new_tcon__):
     data.Maybe("a")
     data.Either("a", "b")
     """
-    pass
+    __slots__ = ()
 
 
 ## "d"/data constructor half of the expression
@@ -576,6 +819,8 @@ class __new_dcon__(Syntax):
     Base class for Syntax objects that handle data constructor creation syntax
     within a `data` statment (`d.*`).
     """
+    __slots__ = ("name", "args", "classes")
+
     def __init__(self, dcon_name, args=(), classes=()):
         self.name = dcon_name
         self.args = args
@@ -595,6 +840,8 @@ class __new_dcon_params__(__new_dcon__):
     d.Just("a")
     d.Foo(int, "a", "b", str)
     """
+    __slots__ = ()
+
     def __and__(self, derive_exp):
         if not isinstance(derive_exp, deriving):
             raise self.invalid_syntax
@@ -622,7 +869,7 @@ class __new_dcon_deriving__(__new_dcon__):
     d.Just("a") & deriving(Show, Eq, Ord)
     d.Bar & deriving(Eq)
     """
-    pass
+    __slots__ = ()
 
 
 class __new_dcon_enum__(__new_dcon_params__):
@@ -636,6 +883,8 @@ class __new_dcon_enum__(__new_dcon_params__):
     d.Just
     d.Foo
     """
+    __slots__ = ()
+
     def __call__(self, *typeargs):
         return __new_dcon_params__(self.name, typeargs)
 
@@ -651,6 +900,8 @@ class __new_dcons_deriving__(Syntax):
     d.Nothing | d.Just("a") & deriving(Show, Eq, Ord)
     d.Foo(int, "a", "b", str) | d.Bar & deriving(Eq)
     """
+    __slots__ = ("dcons", "classes")
+
     def __init__(self, data_consts, classes=()):
         self.dcons = data_consts
         self.classes = classes
@@ -668,6 +919,7 @@ class __new_dcons__(__new_dcons_deriving__):
 
     d.Foo(int, "a", "b", str) | d.Bar
     """
+    __slots__ = ()
 
     def __init__(self, data_consts):
         super(__new_dcons__, self).__init__(data_consts)
@@ -695,6 +947,8 @@ class deriving(Syntax):
 
     See help(data) for more information.
     """
+    __slots__ = ("classes",)
+
     def __init__(self, *tclasses):
         for tclass in tclasses:
             if not issubclass(tclass, Typeclass):
@@ -724,37 +978,43 @@ class __section__(Syntax):
 
     Operators supported:
     + - * / // ** >> << | & ^ == != > >= < <=
+
+    Each section records the operator it applies in its __operator__
+    attribute, as a tuple (operator, flipped, operands), where operands is
+    (y,) for a single section and () for a double section, so that code that
+    can apply the operator in bulk (e.g. to a whole array) can recognise it.
     """
     def __init__(self, syntax_err_msg):
         super(__section__, self).__init__(syntax_err_msg)
         return
 
     @staticmethod
-    def __make_section(fn):
+    def __make_section(op, flipped=False):
         """
         Create an operator section from a binary operator.
         """
+        fn = (lambda x, y: op(y, x)) if flipped else op
+
         def section_wrapper(self, y):
             # double section, e.g. (__+__)
             if isinstance(y, __section__):
                 @sig(H/ "a" >> "b" >> "c")
                 def double_section(a, b):
                     return fn(a, b)
+                double_section.__operator__ = (op, flipped, ())
                 return double_section
 
             # single section, e.g. (__+1) or (1+__)
             @sig(H/ "a" >> "b")
             def section(a):
                 return fn(a, y)
+            section.__operator__ = (op, flipped, (y,))
             return section
         return section_wrapper
 
-    # left section, e.g. (__+1)
+    # left sections, e.g. (__+1), and right sections, e.g. (1+__)
     __wrap = __make_section.__func__
 
-    # right section, e.g. (1+__)
-    __flip = lambda f: lambda x, y: f(y, x)
-
     __add__ = __wrap(operator.add)
     __sub__ = __wrap(operator.sub)
     __mul__ = __wrap(operator.mul)
@@ -777,20 +1037,20 @@ class __section__(Syntax):
     __ge__ = __wrap(operator.ge)
     __le__ = __wrap(operator.le)
 
-    __radd__ = __wrap(__flip(operator.add))
-    __rsub__ = __wrap(__flip(operator.sub))
-    __rmul__ = __wrap(__flip(operator.mul))
-    __rdiv__ = __wrap(__flip(operator.div))
-    __rtruediv__ = __wrap(__flip(operator.truediv))
-    __rfloordiv__ = __wrap(__flip(operator.floordiv))
-    __rmod__ = __wrap(__flip(operator.mod))
-    __rdivmod__ = __wrap(__flip(divmod))
-    __rpow__ = __wrap(__flip(operator.pow))
-    __rlshift__ = __wrap(__flip(operator.lshift))
-    __rrshift__ = __wrap(__flip(operator.rshift))
-    __ror__ = __wrap(__flip(operator.or_))
-    __rand__ = __wrap(__flip(operator.and_))
-    __rxor__ = __wrap(__flip(operator.xor))
+    __radd__ = __wrap(operator.add, True)
+    __rsub__ = __wrap(operator.sub, True)
+    __rmul__ = __wrap(operator.mul, True)
+    __rdiv__ = __wrap(operator.div, True)
+    __rtruediv__ = __wrap(operator.truediv, True)
+    __rfloordiv__ = __wrap(operator.floordiv, True)
+    __rmod__ = __wrap(operator.mod, True)
+    __rdivmod__ = __wrap(divmod, True)
+    __rpow__ = __wrap(operator.pow, True)
+    __rlshift__ = __wrap(operator.lshift, True)
+    __rrshift__ = __wrap(operator.rshift, True)
+    __ror__ = __wrap(operator.or_, True)
+    __rand__ = __wrap(operator.and_, True)
+    __rxor__ = __wrap(operator.xor, True)
 
 
 __ = __section__("Error in section")
@@ -825,10 +1085,12 @@ class __guard_test__(Syntax):
 
     See help(guard) for more details.
     """
+    __slots__ = ("check",)
+
     def __init__(self, fn):
         if not callable(fn):
             raise ValueError("Guard condition must be callable")
-        self.__test = fn
+        self.check = fn
         super(__guard_test__, self).__init__("Syntax error in guard condition")
 
     def __rshift__(self, value):
@@ -836,7 +1098,7 @@ class __guard_test__(Syntax):
            isinstance(value, __guard_conditional__) or \
            isinstance(value, __guard_base__):
             raise self.invalid_syntax
-        return __guard_conditional__(self.__test, value)
+        return __guard_conditional__(self.check, value)
 
 
 class __guard_conditional__(Syntax):
@@ -848,6 +1110,8 @@ class __guard_conditional__(Syntax):
            to True
     See help(guard) for more details.
     """
+    __slots__ = ("check", "return_value")
+
     def __init__(self, fn, return_value):
         self.check = fn
         self.return_value = return_value
@@ -863,6 +1127,8 @@ class __guard_base__(Syntax):
 
     See help(guard) for more details.
     """
+    __slots__ = ("value",)
+
     def __init__(self, value):
         self.value = value
         super(__guard_base__, self).__init__("Syntax error in guard")
@@ -875,6 +1141,8 @@ class __unmatched_guard__(__guard_base__):
 
     See help(guard) for more details.
     """
+    __slots__ = ()
+
     def __or__(self, cond):
         # Consume the next line of the guard expression
 
@@ -892,6 +1160,10 @@ class __unmatched_guard__(__guard_base__):
 
         # If the condition is not satisfied, continue on with the next line,
         # still in __unmatched_guard__ state with the return value not set
+        # (the guard object itself is replaced, since inverting it is a
+        # syntax error)
+        elif type(self) is __unmatched_guard__:
+            return self
         return __unmatched_guard__(self.value)
 
     def __invert__(self):
@@ -905,6 +1177,8 @@ class __matched_guard__(__guard_base__):
 
     See help(guard) for more details.
     """
+    __slots__ = ()
+
     def __or__(self, cond):
         # Consume the next line of the guard expression
         # Since a condition has already been satisfied, we can ignore the rest
@@ -953,10 +1227,77 @@ class guard(__unmatched_guard__):
     Raises:
         NoGuardMatchException (if no match is found)
 
+    A guard expression builds all of its conditions and return values every
+    time it is evaluated: Python evaluates each c(...) >> value line into an
+    object before the guard is given it, so the guard syntax itself cannot
+    avoid allocating per line. Guards that are applied to many values (e.g.
+    in a function mapped over a List) should be compiled instead.
+
+    guard.compile builds the conditions once, into a
+    reusable function. Each line is either a guard condition as above, or a
+    (condition, function) pair, where the condition is a c(...) test (or a
+    plain test function) and the function computes the return value from the
+    value being tested. Only the function of the first satisfied condition is
+    called:
+
+    porridge = guard.compile(
+        (c(__ < 20), lambda t: "%d is too cold!" % t),
+        (c(__ < 90), lambda t: "%d is just right!" % t),
+        otherwise >> "Too hot!")
+
+    porridge(50) # "50 is just right!"
     """
+    __slots__ = ()
+
     def __invert__(self):
         raise self.invalid_syntax
 
+    @classmethod
+    def compile(cls, *lines):
+        return __compiled_guard__(lines)
+
+
+class __compiled_guard__(Syntax):
+    """
+    A guard expression compiled into a tuple of conditions and a tuple of
+    functions that compute the corresponding return values.
+
+    See help(guard) for usage.
+    """
+    __slots__ = ("conditions", "functions")
+
+    def __init__(self, lines):
+        super(__compiled_guard__, self).__init__("Syntax error in guard")
+        conditions, functions = [], []
+
+        for line in lines:
+            if isinstance(line, __guard_conditional__):
+                value = line.return_value
+                conditions.append(line.check)
+                functions.append(lambda _, value=value: value)
+                continue
+
+            elif not isinstance(line, tuple) or len(line) != 2 or \
+                 not callable(line[0]) or not callable(line[1]):
+                raise SyntaxError("Expected guard condition or (condition, "
+                                  "function), found %s" % str(line))
+
+            condition, function = line
+            if isinstance(condition, __guard_test__):
+                condition = condition.check
+            conditions.append(condition)
+            functions.append(function)
+
+        self.conditions = tuple(conditions)
+        self.functions = tuple(functions)
+        return
+
+    def __call__(self, value):
+        for i, condition in enumerate(self.conditions):
+            if condition(value):
+                return self.functions[i](value)
+        raise NoGuardMatchException("No match found in guard(%s)" % value)
+
 
 c = __guard_test__
 otherwise = c(lambda _: True)
@@ -82,10 +82,6 @@ class TypeMeta(type):
         try:
             if isinstance(item, ADT):
                 return self.__instances__[id(item.__type_constructor__)]
-            elif isinstance(typeof(item), ListType):
-                return self.__instances__[id(type(item))]
-            elif isinstance(item, Hask):
-                return self.__instances__[id(typeof(item))]
             return self.__instances__[id(type(item))]
         except KeyError:
             raise TypeError("No instance for {0}".format(item))
@@ -167,10 +163,20 @@ class Hask(object):
 
     All subclasses must define __type__, which returns a representation of the
     object in the internal type system language.
+
+    Subclasses whose type can be expensive to compute (e.g. lazy Lists, which
+    must evaluate an element to find out their type) may also define
+    __assume_type__, which is given the type that the object is expected to
+    have (e.g. the return type of a TypedFunc that returned it). It returns
+    True if the object takes that type without computing its own, and False
+    otherwise.
     """
     def __type__(self):
         raise TypeError()
 
+    def __assume_type__(self, expected_type):
+        return False
+
 
 class Undefined(Hask):
     """
@@ -216,6 +222,45 @@ def typeof(obj):
     return TypeOperator(type(obj), [])
 
 
+__monotype_classes__ = {}
+
+
+def monotype_classes(obj):
+    """
+    Returns the set of classes whose instances all have the same type as an
+    object within the internal type system, if the class of the object alone
+    determines its type, and None otherwise.
+
+    This is the class of the object itself for most Python objects, all of
+    the Python function types for functions, and the classes of all of the
+    data constructors of an ADT with no type parameters. Tuples, ADTs with
+    type parameters, and other Hask objects have no such set of classes.
+
+    Args:
+        obj: the object to inspect
+
+    Returns:
+        A frozenset of classes, or None
+    """
+    cls = type(obj)
+    if isinstance(obj, ADT):
+        if len(cls.__params__) > 0:
+            return None
+        return cls.__classes__
+
+    elif cls in __monotype_classes__:
+        return __monotype_classes__[cls]
+
+    elif issubclass(cls, (Hask, tuple)):
+        classes = None
+    elif cls in __python_function_types__:
+        classes = frozenset(__python_function_types__)
+    else:
+        classes = frozenset((cls,))
+    __monotype_classes__[cls] = classes
+    return classes
+
+
 class TypeSignature(object):
     """
     Internal representation of a type signature, consisting of a list of
@@ -332,9 +377,44 @@ def build_sig(type_signature, var_dict=None):
     return [build_sig_arg(i, cons, var_dict) for i in args]
 
 
+class TailCall(object):
+    """
+    A call in tail position, returned by TypedFunc.tailcall. When a TypedFunc
+    returns a TailCall, the call is made in a loop by the TypedFunc that
+    returned it, instead of on the Python stack.
+    """
+    __slots__ = ("fn", "args")
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+        return
+
+
+def trampoline(result):
+    """
+    Run tail calls until a result that is not a TailCall is produced.
+    """
+    while type(result) is TailCall:
+        result = result.fn(*result.args)
+    return result
+
+
 class TypedFunc(Hask):
     """
     Partially applied, statically typed function wrapper.
+
+    A TypedFunc that calls itself (or any other TypedFunc) in tail position can
+    return fn.tailcall(*args) instead of fn(*args). The call is then made in a
+    loop, so recursion of any depth runs in constant stack space, and the
+    arguments of the tail call are not type checked again; only the original
+    call and the final result are.
+
+    @sig(H/ int >> int >> int)
+    def sum_to(n, acc):
+        if n == 0:
+            return acc
+        return sum_to.tailcall(n - 1, acc + n)
     """
     def __init__(self, fn, fn_args, fn_type):
         self.__doc__ = fn.__doc__
@@ -360,8 +440,10 @@ class TypedFunc(Hask):
         result_type = analyze(ap, env)
 
         if len(self.fn_args) - 1 == len(args):
-            result = self.func(*args)
-            unify(result_type, typeof(result))
+            result = trampoline(self.func(*args))
+            if not isinstance(result, Hask) or \
+               not result.__assume_type__(result_type):
+                unify(result_type, typeof(result))
             return result
         return TypedFunc(functools.partial(self.func, *args, **kwargs),
                          self.fn_args[len(args):], result_type)
@@ -374,6 +456,17 @@ class TypedFunc(Hask):
         """
         return self.__call__(arg)
 
+    def tailcall(self, *args):
+        """
+        Call the function in tail position, without growing the stack and
+        without type checking the arguments.
+
+        Returns: a TailCall, which must be returned by the calling TypedFunc
+        """
+        if len(self.fn_args) - 1 != len(args):
+            raise TypeError("Tail calls must be fully applied")
+        return TailCall(self.func, args)
+
     def __mul__(self, fn):
         """
         (*) :: (b -> c) -> (a -> b) -> (a -> c)
@@ -387,7 +480,7 @@ class TypedFunc(Hask):
         compose = Lam("arg", App(Var(id(self)), App(Var(id(fn)), Var("arg"))))
         newtype = analyze(compose, env)
 
-        composed_fn = lambda x: self.func(fn.func(x))
+        composed_fn = lambda x: self.func(trampoline(fn.func(x)))
         newargs = [fn.fn_args[0]] + self.fn_args[1:]
 
         return TypedFunc(composed_fn, fn_args=newargs, fn_type=newtype)
@@ -416,7 +509,8 @@ def make_type_const(name, typeargs):
     def raise_fn(err):
         raise err()
 
-    default_attrs = {"__params__":tuple(typeargs), "__constructors__":()}
+    default_attrs = {"__params__":tuple(typeargs), "__constructors__":(),
+                     "__classes__":frozenset()}
     cls = type(name, (ADT,), default_attrs)
 
     cls.__type__ = lambda self: \
@@ -460,6 +554,7 @@ def make_data_const(name, fields, type_constructor, slot_num):
     cls = type(name, (type_constructor, base), {})
     cls.__type_constructor__ = type_constructor
     cls.__ADT_slot__ = slot_num
+    type_constructor.__classes__ |= frozenset((cls,))
 
     if len(fields) == 0:
         # If the data constructor takes no arguments, create an instance of it
@@ -576,3 +671,100 @@ def pattern_match(value, pattern, env=None):
             return True, env
 
     return False, env
+
+
+def __match_any(value, env):
+    return True
+
+
+def compile_pattern(pattern, names):
+    """
+    Compile a pattern into a matching function. Unlike pattern_match, the
+    structure of the pattern is inspected only once, so matching a value
+    costs no more than the checks that the pattern actually needs.
+
+    Variables named `_` are wildcards: they match anything, bind nothing, and
+    may be used several times in the same pattern.
+
+    Args:
+        pattern: a pattern, consisting of literals and/or locally bound
+                 variables
+        names: a set of the variable names bound so far (updated in place)
+
+    Returns: a function (value, env) -> bool, which adds the variables bound
+             by the pattern to env if the match is successful
+
+    Raises:
+        SyntaxError, if a variable name is used multiple times in the same
+        pattern
+    """
+    if isinstance(pattern, PatternMatchBind):
+        name = pattern.name
+        if name == "_":
+            return __match_any
+        elif name in names:
+            raise SyntaxError("Conflicting definitions for %s" % name)
+        names.add(name)
+
+        def match_bind(value, env):
+            env[name] = value
+            return True
+        return match_bind
+
+    elif isinstance(pattern, PatternMatchListBind):
+        size = len(pattern.head)
+        heads = [compile_pattern(p, names) for p in pattern.head]
+        tail = compile_pattern(pattern.tail, names)
+
+        def match_cons(value, env):
+            try:
+                head = list(value[:size])
+            except TypeError:
+                return False
+            if len(head) != size:
+                return False
+            for match, item in zip(heads, head):
+                if not match(item, env):
+                    return False
+            return tail(value[size:], env)
+        return match_cons
+
+    elif isinstance(pattern, ADT):
+        dcon = type(pattern)
+        fields = [(i, compile_pattern(p, names))
+                  for i, p in enumerate(nt_to_tuple(pattern))]
+        fields = [(i, match) for i, match in fields if match is not __match_any]
+
+        def match_adt(value, env):
+            if type(value) is not dcon:
+                return False
+            for i, match in fields:
+                if not match(value[i], env):
+                    return False
+            return True
+        return match_adt
+
+    elif hasattr(pattern, "__iter__"):
+        cls = type(pattern)
+        size = len(pattern)
+        items = [compile_pattern(p, names) for p in pattern]
+        # lazy sequences are sliced before measuring, so that they are only
+        # evaluated as far as the pattern needs
+        sliced = cls not in (tuple, list) and hasattr(pattern, "__getitem__")
+
+        def match_iter(value, env):
+            if type(value) is not cls:
+                return False
+            elif len(value[:size+1] if sliced else value) != size:
+                return False
+            for match, item in zip(items, value):
+                if not match(item, env):
+                    return False
+            return True
+        return match_iter
+
+    cls = type(pattern)
+
+    def match_literal(value, env):
+        return type(value) is cls and value == pattern
+    return match_literal
@@ -1,6 +1,11 @@
 import operator
+import struct
+import sys
+from collections import namedtuple
 
 from type_system import Typeclass
+from type_system import Hask
+from type_system import ADT
 from type_system import is_builtin
 from type_system import nt_to_tuple
 from type_system import build_instance
@@ -101,6 +106,30 @@ class Eq(Typeclass):
                 nt_to_tuple(self) != nt_to_tuple(other)
 
         Eq.make_instance(cls, eq=__eq__, ne=__ne__)
+
+        # Nullary data constructors are singletons, so comparing one against
+        # another value of the same type only needs an identity check. Values
+        # of other types still go through the typed path (and fail to unify).
+        typed_eq, typed_ne = cls.__eq__, cls.__ne__
+
+        def enum_eq(self, other):
+            if self is other:
+                return True
+            elif getattr(other, "__type_constructor__", None) is cls:
+                return False
+            return typed_eq(self, other)
+
+        def enum_ne(self, other):
+            if self is other:
+                return False
+            elif getattr(other, "__type_constructor__", None) is cls:
+                return True
+            return typed_ne(self, other)
+
+        for data_con in cls.__constructors__:
+            if isinstance(data_con, cls):
+                type(data_con).__eq__ = enum_eq
+                type(data_con).__ne__ = enum_ne
         return
 
 
@@ -231,6 +260,180 @@ class Read(Typeclass):
         return
 
 
+class InternStats(namedtuple("InternStats", ["constructed", "deduplicated",
+                                             "live", "memory_saved"])):
+    """
+    Summary of hash-consing for an ADT that derives Interned.
+
+    Attributes:
+        constructed: number of calls to the data constructors
+        deduplicated: number of those calls that returned an existing value
+        live: number of distinct values currently held in the intern tables
+        memory_saved: bytes not allocated thanks to deduplication
+        dedupe_rate: deduplicated / constructed
+    """
+    @property
+    def dedupe_rate(self):
+        if self.constructed == 0:
+            return 0.0
+        return float(self.deduplicated) / self.constructed
+
+
+class InternTable(object):
+    """
+    Hash-consing table for a single data constructor.
+
+    ADT values are tuples, and CPython cannot weakly reference tuple
+    subclasses, so instead of a WeakValueDictionary the table sweeps out values
+    that nothing else refers to whenever it doubles in size.
+    """
+    def __init__(self, data_con, sweep_at=1024):
+        self.new = data_con.__bases__[-1].__new__
+        self.values = {}
+        self.constructed = 0
+        self.deduplicated = 0
+        self.memory_saved = 0
+        self.min_sweep = sweep_at
+        self.sweep_at = sweep_at
+
+    def __call__(self, cls, *args):
+        self.constructed += 1
+        key = InternTable.__key(args)
+        try:
+            value = None if key is None else self.values.get(key)
+        except TypeError:
+            # unhashable field, or a field that cannot be compared
+            key = None
+
+        if key is None:
+            return self.new(cls, *args)
+        elif value is not None:
+            self.deduplicated += 1
+            self.memory_saved += sys.getsizeof(value)
+            return value
+
+        value = self.new(cls, *args)
+        try:
+            self.values[key] = value
+        except TypeError:
+            # the key collided with one that cannot be compared to it
+            return value
+
+        if len(self.values) >= self.sweep_at:
+            self.sweep()
+            self.sweep_at = max(self.min_sweep, 2 * len(self.values))
+        return value
+
+    @staticmethod
+    def __key(value):
+        """
+        The key of a value (e.g. the tuple of the fields of an ADT value) in
+        the table. Values have the same key only if they are interchangeable:
+        they have the same type, their fields or elements have the same keys
+        (for tuples, ADT values and Lists), and they have the same bits (for
+        floats, since e.g. 0.0 == -0.0). Otherwise, values that are equal
+        have the same key.
+
+        Returns: the key, or None if the value has a List in it that is not
+        fully evaluated (hashing the List would evaluate it, forever if it is
+        infinite)
+        """
+        cls = type(value)
+        if isinstance(value, ADT):
+            items = nt_to_tuple(value)
+        elif isinstance(value, tuple):
+            items = value
+        elif cls is float:
+            return cls, struct.pack("d", value)
+        elif cls is complex:
+            return cls, struct.pack("dd", value.real, value.imag)
+        elif isinstance(value, Hask):
+            from lazylist import List
+            if not isinstance(value, List):
+                return cls, value
+            elif not value.is_evaluated():
+                return None
+            items = value
+        else:
+            return cls, value
+
+        keys = []
+        for item in items:
+            key = InternTable.__key(item)
+            if key is None:
+                return None
+            keys.append(key)
+        return cls, tuple(keys)
+
+    def sweep(self):
+        """
+        Drop all values that are referenced only by the table itself (one
+        reference from the dict, one from the getrefcount argument).
+        """
+        values = self.values
+        for key in values.keys():
+            if sys.getrefcount(values[key]) <= 2:
+                del values[key]
+        return
+
+
+class Interned(Typeclass):
+    """
+    Hash-consing for immutable ADT values. Deriving Interned makes every data
+    constructor return the existing value when it is called with arguments it
+    has already seen (and that are still in use), so datasets that repeat the
+    same small values, e.g. Just(0) or Left("error"), share one object per
+    distinct value.
+
+    Nullary data constructors are already singletons and are left alone.
+
+    See help(intern_stats) for dedupe rates and memory savings.
+
+    Attributes:
+        tables
+    """
+    @classmethod
+    def make_instance(typeclass, cls, tables):
+        build_instance(Interned, cls, {"tables":tables})
+        return
+
+    @classmethod
+    def derive_instance(typeclass, cls):
+        tables = []
+        for data_con in cls.__constructors__:
+            if isinstance(data_con, cls):
+                continue
+            table = InternTable(data_con)
+            data_con.__new__ = staticmethod(table)
+            tables.append(table)
+        Interned.make_instance(cls, tables=tuple(tables))
+        return
+
+
+def intern_stats(cls):
+    """
+    Report how effective hash-consing has been for a type constructor that
+    derives Interned.
+
+    Args:
+        cls: the type constructor (e.g. Maybe)
+
+    Returns:
+        An InternStats tuple, summed over all data constructors of cls
+    """
+    try:
+        tables = Interned.__instances__[id(cls)].tables
+    except KeyError:
+        raise TypeError("No instance for Interned %s" % cls.__name__)
+
+    for table in tables:
+        table.sweep()
+    return InternStats(sum((tb.constructed for tb in tables)),
+                       sum((tb.deduplicated for tb in tables)),
+                       sum((len(tb.values) for tb in tables)),
+                       sum((tb.memory_saved for tb in tables)))
+
+
 #=============================================================================#
 # Instances for builtin types
 
@@ -243,6 +446,7 @@ instance(Show, complex).where(show=complex.__str__)
 instance(Show, bool).where(show=bool.__str__)
 instance(Show, list).where(show=list.__str__)
 instance(Show, tuple).where(show=tuple.__str__)
+instance(Show, buffer).where(show=lambda b: "buffer(%r)" % str(b))
 
 instance(Eq, str).where(eq=str.__eq__, ne=str.__ne__)
 instance(Eq, int).where(eq=int.__eq__, ne=int.__ne__)
@@ -252,6 +456,7 @@ instance(Eq, complex).where(eq=complex.__eq__, ne=complex.__ne__)
 instance(Eq, bool).where(eq=bool.__eq__, ne=bool.__ne__)
 instance(Eq, list).where(eq=list.__eq__, ne=list.__ne__)
 instance(Eq, tuple).where(eq=tuple.__eq__, ne=tuple.__ne__)
+instance(Eq, buffer).where(eq=lambda b, c: b == c, ne=lambda b, c: b != c)
 
 instance(Ord, str).where(lt=str.__lt__, le=str.__le__,
                          gt=str.__gt__, ge=str.__ge__)
@@ -269,3 +474,5 @@ instance(Ord, list).where(lt=list.__lt__, le=list.__le__,
                           gt=list.__gt__, ge=list.__ge__)
 instance(Ord, tuple).where(lt=tuple.__lt__, le=tuple.__le__,
                            gt=tuple.__gt__, ge=tuple.__ge__)
+instance(Ord, buffer).where(lt=lambda b, c: b < c, le=lambda b, c: b <= c,
+                            gt=lambda b, c: b > c, ge=lambda b, c: b >= c)
@@ -1,13 +1,23 @@
+import array
+import itertools
 import math
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
 from hask_ideas import H, sig, t, func, TypeSignatureError
-from hask_ideas import p, m, caseof, IncompletePatternError
+from hask_ideas import p, m, caseof, equations, IncompletePatternError
 from hask_ideas import has_instance
 from hask_ideas import guard, c, otherwise, NoGuardMatchException
 from hask_ideas import __
 from hask_ideas import data, d, deriving, instance
-from hask_ideas import L
+from hask_ideas import Interned, intern_stats
+from hask_ideas import L, Stream, StreamConsumedError, EvictedError
+from hask_ideas import records
 from hask_ideas import Ordering, LT, EQ, GT
 from hask_ideas import Maybe, Just, Nothing, in_maybe
 from hask_ideas import Either, Left, Right, in_either
@@ -22,6 +32,7 @@ from hask_ideas.lang.type_system import build_sig_arg
 from hask_ideas.lang.type_system import build_sig
 from hask_ideas.lang.type_system import build_ADT
 from hask_ideas.lang.type_system import typeof
+from hask_ideas.lang.type_system import monotype_classes
 from hask_ideas.lang.type_system import pattern_match
 from hask_ideas.lang.type_system import PatternMatchBind
 
@@ -37,6 +48,8 @@ from hask_ideas.lang.hindley_milner import analyze
 from hask_ideas.lang.hindley_milner import unify
 
 from hask_ideas.lang.lazylist import List
+from hask_ideas.lang.lazylist import Spine
+from hask_ideas.lang.lazylist import Prefetcher
 
 te = TypeError
 se = SyntaxError
@@ -602,6 +615,8 @@ class TestADTInternals_Enum(unittest.TestCase):
     def test_adt(self):
         self.assertEqual(list(self.Type_Const.__constructors__),
                          [self.E1, self.E2, self.E3])
+        self.assertEqual(set(map(type, (self.E1, self.E2, self.E3))),
+                         monotype_classes(self.E2))
         self.assertTrue(isinstance(self.E1, self.Type_Const))
         self.assertTrue(isinstance(self.E2, self.Type_Const))
         self.assertTrue(isinstance(self.E3, self.Type_Const))
@@ -873,6 +888,55 @@ class TestADTSyntax(unittest.TestCase):
         with self.assertRaises(te): X1 < A("a", "a")
         with self.assertRaises(te): data.X == d.A | d.B & deriving(Show, 1)
 
+    def test_interned(self):
+        T, I1, I2, I3 =\
+        data.T("a") == d.I1("a") | d.I2(str, "a") | d.I3 \
+                       & deriving(Show, Eq, Interned)
+
+        self.assertTrue(I1(1) is I1(1))
+        self.assertTrue(I2("a", 1) is I2("a", 1))
+        self.assertFalse(I1(1) is I1(2))
+        self.assertFalse(I1(1) is I1(1.0))
+        self.assertFalse(I1(1) is I1(True))
+        self.assertFalse(I1([1]) is I1([1]))
+        self.assertEqual(I1([1]), I1([1]))
+        self.assertEqual("I2('a', 1)", str(I2("a", 1)))
+
+        # values that are equal but not interchangeable are kept apart, down
+        # through tuples, ADT values and Lists
+        self.assertFalse(I1(-0.0) is I1(0.0))
+        self.assertEqual("I1(0.0)", str(I1(0.0)))
+        self.assertEqual("I1((True,))", str(I1((1,)) and I1((True,))))
+        self.assertEqual("I1(Just(True))", str(I1(Just(1)) and I1(Just(True))))
+        self.assertFalse(I1(L[[0.0]]) is I1(L[[-0.0]]))
+        self.assertTrue(I1((1, Just(2.5))) is I1((1, Just(2.5))))
+        self.assertTrue(I1(Just(L[1, 2])) is I1(Just(L[1, 2])))
+
+        # nullary constructors compare by identity, but are still typed
+        self.assertTrue(I3 == I3)
+        self.assertFalse(I3 != I3)
+        self.assertFalse(I3 == I1(1))
+        self.assertTrue(I3 != I1(1))
+        with self.assertRaises(te): I3 == Nothing
+
+        # values with Lists that are not fully evaluated are not interned,
+        # since that would evaluate the Lists
+        xs = L[(i for i in range(3))]
+        self.assertFalse(I1(xs) is I1(xs))
+        self.assertFalse(I2("a", (1, xs)) is I2("a", (1, xs)))
+        self.assertFalse(xs.is_evaluated())
+        self.assertEqual(L[1, 2, 3], I1(L[1, ...])[0][:3])
+        self.assertTrue(I1(L[1, 2]) is I1(L[1, 2]))
+
+        values = [I1(i % 10) for i in range(1000)]
+        stats = intern_stats(T)
+        self.assertEqual(10, stats.live)
+        self.assertTrue(stats.dedupe_rate > 0.9)
+        self.assertTrue(stats.memory_saved > 0)
+        del values
+        self.assertEqual(0, intern_stats(T).live)
+        with self.assertRaises(te): intern_stats(Maybe)
+
 
 class TestBuiltins(unittest.TestCase):
 
@@ -963,6 +1027,22 @@ class TestSyntax(unittest.TestCase):
         with self.assertRaises(se): s |= 1
         with self.assertRaises(se): s ^= 1
 
+    def test_syntax_slots(self):
+        # syntax objects have no __dict__, and build their errors lazily
+        line = c(lambda x: x > 1) >> 1
+        for obj in (line, guard(1), H/ int >> int, sig(H/ int >> int),
+                    deriving(Show), caseof(1)):
+            self.assertFalse(hasattr(obj, "__dict__"))
+        with self.assertRaises(AttributeError): line.foo = 1
+
+        from hask_ideas.lang.syntax import Syntax
+        self.assertIsNot(Syntax("err").invalid_syntax,
+                         Syntax("err").invalid_syntax)
+        self.assertEqual(("err",), Syntax("err").invalid_syntax.args)
+        with self.assertRaises(se) as raised: line >> 2
+        self.assertEqual(("Syntax error in guard condition",),
+                         raised.exception.args)
+
     def test_section(self):
         """Operator sections (e.g. `(1+__)` )"""
 
@@ -1068,6 +1148,29 @@ class TestSyntax(unittest.TestCase):
         with self.assertRaises(se): otherwise >> "1" >> "2"
         with self.assertRaises(se): "1" >> otherwise
 
+    def test_guard_compile(self):
+        me = NoGuardMatchException
+
+        porridge = guard.compile(
+            (c(__ < 20),          lambda x: "%d is too cold!" % x),
+            (lambda x: x < 90,    lambda x: "%d is just right!" % x),
+            (otherwise,           lambda x: 1 / 0))
+        self.assertEqual("10 is too cold!", porridge(10))
+        self.assertEqual("50 is just right!", porridge(50))
+        with self.assertRaises(ZeroDivisionError): porridge(100)
+
+        sign = guard.compile(
+            c(__ < 0)  >> -1,
+            c(__ == 0) >> 0)
+        self.assertEqual([-1, 0, -1], [sign(x) for x in (-5, 0, -1)])
+        with self.assertRaises(me): sign(1)
+        with self.assertRaises(me): guard.compile()(1)
+
+        with self.assertRaises(se): guard.compile(c(__ < 0))
+        with self.assertRaises(se): guard.compile((c(__ < 0), 1))
+        with self.assertRaises(se): guard.compile((1, lambda x: x))
+        with self.assertRaises(se): guard.compile(1)
+
     def test_caseof(self):
 
         # literal matching
@@ -1184,6 +1287,153 @@ class TestSyntax(unittest.TestCase):
                 | m(m.a ^ 1) >> False
                 | m(m.a)     >> True)
 
+    def test_caseof_threads(self):
+        from hask_ideas.lang.syntax import MatchStack
+        from hask_ideas.Data.List import foldr, null
+        from hask_ideas.Data.Maybe import isNothing
+        from hask_ideas.Prelude import fmap
+
+        # frames are not leaked when an exception is raised mid-match
+        def raises():
+            try:
+                ~(caseof(1) | m(m.x) >> 1 / 0)
+            except ZeroDivisionError:
+                return 5
+        self.assertEqual(8, ~(caseof(Just(3))
+                                | m(Just(m.a)) >> raises() + p.a
+                                | m(Nothing)   >> 0))
+        self.assertEqual(0, len(MatchStack.get_stack()))
+
+        # pattern-heavy code gives the right answers across threads
+        errors = []
+        double = (lambda a: Just(a * 2)) ** (H/ int >> t(Maybe, int))
+        def work(n):
+            try:
+                for i in range(10):
+                    x = n * 100 + i
+                    self.assertTrue(isNothing(Nothing))
+                    self.assertFalse(isNothing(Just(x)))
+                    self.assertEqual(Just(x + 1), fmap(__+1, Just(x)))
+                    self.assertEqual(Just(x * 2), Just(x) >> double)
+                    self.assertFalse(null(L[[x]]))
+                    self.assertEqual(sum(range(x, x + 6)),
+                                     foldr(__+__, 0, L[x, ..., x + 5]))
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=work, args=(n,))
+                       for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+        self.assertEqual([], errors)
+
+    def test_caseof_compile(self):
+        fib_case = caseof.compile(
+            (0,   lambda: 1),
+            (1,   lambda: 1),
+            (m.n, lambda n: fib(n - 1) + fib(n - 2)))
+        fib = lambda x: fib_case(x)
+        self.assertEqual(1, fib(0))
+        self.assertEqual(89, fib(10))
+
+        # constructors, literals and wildcards keep their order
+        maybe_case = caseof.compile(
+            (Just(1),    lambda: "one"),
+            (m._,        lambda: "other"),
+            (Just(m.x),  lambda x: x),
+            (Nothing,    lambda: "nothing"))
+        self.assertEqual("one", maybe_case(Just(1)))
+        self.assertEqual("other", maybe_case(Just(2)))
+        self.assertEqual("other", maybe_case(Nothing))
+        literal_case = caseof.compile(
+            ("a",    lambda: 1),
+            (1,      lambda: 2),
+            ((1, 2), lambda: 3),
+            (1.0,    lambda: 4))
+        self.assertEqual(1, literal_case("a"))
+        self.assertEqual(2, literal_case(1))
+        self.assertEqual(3, literal_case((1, 2)))
+        self.assertEqual(4, literal_case(1.0))
+        with self.assertRaises(IncompletePatternError): literal_case(True)
+        with self.assertRaises(IncompletePatternError): literal_case([1, 2])
+
+        # cons and list patterns, which only evaluate what they need
+        list_case = caseof.compile(
+            (L[[]],              lambda: None),
+            (m.a ^ (m._ ^ m.c),  lambda a, c: (a, c)),
+            (m._,                lambda: False))
+        self.assertEqual(None, list_case(L[[]]))
+        self.assertEqual((1, L[[3]]), list_case(L[1, 2, 3]))
+        self.assertEqual((1, [3]), list_case([1, 2, 3]))
+        self.assertEqual(False, list_case(L[[1]]))
+        self.assertEqual(1, list_case(L[1, ...])[0])
+
+        # only the selected body is evaluated
+        lazy_case = caseof.compile(
+            (Nothing,   lambda: 1 / 0),
+            (Just(m.x), lambda x: x))
+        self.assertEqual(2, lazy_case(Just(2)))
+
+        with self.assertRaises(se): caseof.compile(((m.a, m.a), lambda a: a))
+        with self.assertRaises(se): caseof.compile((1, 2))
+        with self.assertRaises(se): caseof.compile(1)
+
+    def test_equations(self):
+        fib = equations(H/ int >> int)
+
+        @fib.eq(0)
+        def fib():
+            """fib :: int -> int"""
+            return 1
+
+        @fib.eq(1)
+        def fib():
+            return 1
+
+        @fib.eq(m.n)
+        def fib(n):
+            return fib(n - 1) + fib(n - 2)
+
+        self.assertEqual(1, fib(0))
+        self.assertEqual(89, fib(10))
+        self.assertEqual("fib :: int -> int", fib.__doc__)
+        with self.assertRaises(te): fib("a")
+
+        # patterns for every argument, and partial application
+        add = equations(H/ t(Maybe, int) >> int >> int)
+
+        @add.eq(Nothing, m.y)
+        def add(y):
+            return y
+
+        @add.eq(Just(m.x), 0)
+        def add(x):
+            return -x
+
+        @add.eq(Just(m.x), m.y)
+        def add(x, y):
+            return x + y
+
+        self.assertEqual(3, add(Nothing, 3))
+        self.assertEqual(-2, add(Just(2), 0))
+        self.assertEqual(7, add(Just(2))(5))
+        self.assertEqual(7, add(Just(2)) % 5)
+        with self.assertRaises(te): add(Just("a"), 1)
+
+        empty = equations(H/ int >> int)
+        with self.assertRaises(IncompletePatternError): empty(1)
+        with self.assertRaises(se): empty.eq(1, 2)
+        with self.assertRaises(se): empty.eq(m.a ^ m.a)(lambda a: a)
+        with self.assertRaises(se): equations(H/ int)
+        with self.assertRaises(se): equations(int)
+
 
     def test_type_sig(self):
         tse = TypeSignatureError
@@ -1209,6 +1459,56 @@ class TestSyntax(unittest.TestCase):
         with self.assertRaises(se): H[(Maybe, 1)]
         with self.assertRaises(se): sig(H/ "a")(1)
 
+    def test_tailcall(self):
+        from hask_ideas.Data.List import foldr, unfoldr
+
+        @sig(H/ int >> int >> int)
+        def sum_to(n, acc):
+            if n == 0:
+                return acc
+            return sum_to.tailcall(n - 1, acc + n)
+
+        self.assertEqual(sum(range(20001)), sum_to(20000, 0))
+        self.assertEqual(sum(range(20001)), sum_to(20000)(0))
+        with self.assertRaises(te): sum_to("a", 0)
+        with self.assertRaises(te): sum_to.tailcall(1)
+
+        # mutual recursion, and the type of the final result is still checked
+        @sig(H/ int >> bool)
+        def even(n):
+            return True if n == 0 else odd.tailcall(n - 1)
+
+        @sig(H/ int >> bool)
+        def odd(n):
+            return False if n == 0 else even.tailcall(n - 1)
+
+        @sig(H/ int >> int)
+        def bad(n):
+            return odd.tailcall(n)
+
+        self.assertTrue(even(5000))
+        self.assertFalse(odd(5000))
+        with self.assertRaises(te): bad(1)
+
+        countdown = equations(H/ int >> int)
+
+        @countdown.eq(0)
+        def countdown():
+            return 0
+
+        @countdown.eq(m.n)
+        def countdown(n):
+            return countdown.tailcall(n - 1)
+
+        self.assertEqual(0, countdown(5000))
+
+        # recursive library functions run in constant stack space
+        self.assertEqual(sum(range(2000)),
+                         foldr(__ + __, 0, L[0, ..., 1999]))
+        uf = (lambda x: Nothing if x == 2000 else Just((x, x + 1))) ** \
+                (H/ int >> t(Maybe, (int, int)))
+        self.assertEqual(L[0, ..., 1999], unfoldr(uf, 0))
+
 
 class TestTypeclass(unittest.TestCase):
 
@@ -1679,6 +1979,23 @@ class TestList(unittest.TestCase):
         self.assertNotEqual(L[1, 3, ...], L[1, 4, ...])
         self.assertNotEqual(L[1, 4], L[1, 4, ...])
         with self.assertRaises(te): L["a", "b"] == L[1, ...]
+        with self.assertRaises(te): L[1, 2] == 1
+
+        # partially evaluated lists
+        xs, ys = L[(i for i in range(100))], L[(i for i in range(100))]
+        xs[50], ys[10]
+        self.assertEqual(xs, ys)
+        self.assertEqual(ys, xs)
+        self.assertNotEqual(xs, 0 ^ ys)
+        self.assertTrue(xs[1:] > ys)
+        self.assertTrue(L[[0]] + xs < ys + L[[0]])
+
+        # equal lists hash equally
+        self.assertEqual(hash(L[1, 2, 3]), hash(L[(i for i in range(1, 4))]))
+        self.assertEqual(1, len(set([L[1, 2], L[[1, 2]], L[1, ..., 2]])))
+        with self.assertRaises(te): hash(L[1, ...])
+        with self.assertRaises(te): {L[1, 3, ...]: 1}
+        with self.assertRaises(te): set([L[1, 2], L[1, ...]])
 
     def test_ord(self):
         self.assertTrue(L[[]] < L[2, 1])
@@ -1775,6 +2092,35 @@ class TestList(unittest.TestCase):
         with self.assertRaises(te): L[1.0, 2.0] + [3, 4]
         with self.assertRaises(te): L[(i for i in "abc")] + L[1, 2]
 
+    def test_extend_lazy(self):
+        from hask_ideas.Data.List import concat
+        from hask_ideas.Prelude import show
+
+        # concatenation does not copy either List, and only evaluates as much
+        # as the type check needs
+        evaluated = []
+        xs = L[(evaluated.append(i) or i for i in range(5))]
+        ys = L[1, ...] + xs
+        zs = xs + L[5, ..., 9]
+        self.assertEqual([0], evaluated)
+        self.assertEqual(L[0, ..., 9], zs)
+        self.assertEqual(range(5), evaluated)
+        self.assertEqual(L[1, 2, 3], ys[:3])
+
+        # deeply nested concatenations are evaluated without recursion
+        left, right = L[[]], L[[]]
+        for i in range(2000):
+            left = left + L[[i]]
+            right = L[[i]] + right
+        self.assertEqual(L[range(2000)], left)
+        self.assertEqual(L[range(1999, -1, -1)], right)
+        self.assertEqual(L[range(2000)],
+                         concat(L[[L[[i]] for i in range(2000)]]))
+
+        self.assertEqual("L[1, 2, 3, 4]", show(L[1, 2] + L[3, 4]))
+        self.assertEqual("L[1, 2, 3 ...]", show(L[1, 2] + L[3, ...]))
+        self.assertEqual("L[[]]", show(L[[]] + L[[]]))
+
     def test_indexing(self):
         ie = IndexError
 
@@ -1809,6 +2155,68 @@ class TestList(unittest.TestCase):
         self.assertEqual(L[[]], L[1, 2, 3][:4:-1])
         self.assertEqual(L[[3]], L[1, 2, 3][:1:-1])
 
+    def test_tail_views(self):
+        # suffixes do not force the list, and share evaluation with it
+        evaluated = []
+        xs = L[(evaluated.append(i) or i for i in range(10))]
+        ys = xs[3:]
+        self.assertEqual([], evaluated)
+        self.assertEqual(5, ys[2])
+        self.assertEqual(range(6), evaluated)
+        self.assertEqual(L[0, ..., 5], xs[:6])
+        self.assertEqual(range(6), evaluated)
+        self.assertEqual(L[3, ..., 9], ys)
+        self.assertEqual(L[4, ..., 9], ys[1:])
+        self.assertEqual(L[5, ..., 9], ys[1:][1:])
+        self.assertEqual(7, len(ys))
+        self.assertEqual(L[[]], ys[10:])
+        self.assertEqual(0, len(ys[10:]))
+        self.assertEqual(9, ys[-1])
+        with self.assertRaises(IndexError): ys[1:][-7]
+        self.assertEqual(L[0, 3, 4], 0 ^ ys[:2])
+        self.assertEqual(L[3, 4, 0], ys[:2] + L[[0]])
+
+        # destructuring a long list with cons patterns is linear
+        xs, total = L[xrange(20000)], 0
+        while True:
+            matched, env = pattern_match(xs, m.y ^ m.ys)
+            if not matched:
+                break
+            total, xs = total + env["y"], env["ys"]
+        self.assertEqual(sum(range(20000)), total)
+
+    def test_persistent_cons(self):
+        from hask_ideas.Data.List import tail, drop
+
+        # consing onto the front of a list shares it, and never changes it
+        xs = L[[]]
+        for i in range(2000):
+            xs = i ^ xs
+        self.assertEqual(L[1999, 1998, 1997], xs[:3])
+        self.assertEqual(1999, xs[0])
+        self.assertEqual(0, xs[-1])
+        self.assertEqual(2000, len(xs))
+        self.assertEqual(L[[0]], drop(1999, xs))
+        self.assertEqual(L[range(1998, -1, -1)], tail(xs))
+
+        ys = L[1, 2, 3]
+        zs1, zs2, zs3 = 0 ^ ys, 9 ^ ys, 0 ^ ys
+        self.assertEqual(L[1, 2, 3], ys)
+        self.assertEqual(L[0, 1, 2, 3], zs1)
+        self.assertEqual(L[9, 1, 2, 3], zs2)
+        self.assertEqual(L[0, 1, 2, 3], zs3)
+        self.assertEqual(L[8, 1, 2, 3], 8 ^ zs1[1:])
+        self.assertEqual(L[0, 1, 2, 3], zs1)
+        self.assertEqual(L[7, 3], 7 ^ ys[2:])
+        self.assertEqual(L[6, 9, 1], (6 ^ zs2)[:3])
+
+        # lazy lists stay lazy
+        evens = 0 ^ L[2, 4, ...]
+        self.assertEqual(L[-2, 0, 2, 4], (-2 ^ evens)[:4])
+        self.assertEqual(L[0, 2, 4], evens[:3])
+        with self.assertRaises(te): "a" ^ evens
+        with self.assertRaises(te): "a" ^ (1 ^ L[(i for i in [])])
+
     def test_list_comp(self):
         # numeric lists
         self.assertEqual(10, len(L[0, ...][:10]))
@@ -1838,6 +2246,72 @@ class TestList(unittest.TestCase):
         with self.assertRaises(se): L[..., 2]
         with self.assertRaises(se): L[1, ..., 10, 11]
 
+    def test_arithmetic_sequences(self):
+        from hask_ideas.Data.List import reverse, last, drop, elem
+
+        # lengths, elements, membership and slices are computed directly
+        xs = L[1, ..., 10**9]
+        self.assertEqual(10**9, len(xs))
+        self.assertEqual(500000001, xs[5 * 10**8])
+        self.assertEqual(10**9, last(xs))
+        self.assertEqual(10**9 - 2, xs[-3])
+        self.assertTrue(10**9 in xs)
+        self.assertFalse(0 in xs)
+        self.assertFalse(10**9 + 1 in xs)
+        self.assertEqual(10**6 + 1, drop(10**6, xs)[0])
+        self.assertEqual(L[10**9, 10**9 - 1], reverse(xs)[:2])
+        self.assertEqual(L[1, 4, 7], xs[::3][:3])
+        self.assertEqual(333333334, len(xs[::3]))
+        self.assertEqual(2 * 10**9 + 1, L[1, 3, ...][10**9])
+        self.assertTrue(elem(2 * 10**9 + 1, L[1, 3, ...]))
+        self.assertFalse(elem(2 * 10**9, L[1, 3, ...]))
+        self.assertEqual(L[6, 10, 14], L[2, 4, ...][2:8:2])
+
+        # strings that are not single characters are not in ranges of them
+        cs = L["a", ..., "z"]
+        self.assertFalse("ab" in cs or "" in L["a", ...] or elem("ab", cs))
+        self.assertEqual([1, 0, 0], [cs.count(c) for c in ("b", "ab", "")])
+        with self.assertRaises(ValueError): cs.index("ab")
+
+        # with the same elements as any other List
+        self.assertEqual(L[[8, 9, 10]], L[1, ..., 10][-3:])
+        self.assertEqual(L[[8, 6, 4]], L[1, ..., 10][7:2:-2])
+        self.assertEqual(L[[]], L[1, ..., 10][20:])
+        self.assertEqual(L[["e", "c", "a"]], L["a", ..., "e"][::-2])
+        self.assertEqual(L[[3, 4]], L[1, ..., 4][2:])
+        self.assertEqual(L[[1, 2, 3, 4]], 1 ^ L[2, ..., 4])
+        self.assertEqual(4, len(1 ^ L[2, ..., 4]))
+        self.assertEqual(3, (1 ^ L[2, ..., 4])[2])
+        self.assertEqual(L[1, 2, 3, 4], L[1, ..., 2] + L[3, ..., 4])
+        with self.assertRaises(IndexError): L[1, ..., 10][10]
+        with self.assertRaises(IndexError): L[1, ..., 10][-11]
+        with self.assertRaises(IndexError): L[6, ..., 4][0]
+
+    def test_sequence_methods(self):
+        xs = L[(i for i in range(10))]
+        self.assertEqual(3, xs.index(3))
+        self.assertTrue(str(xs).endswith("...]"))
+        self.assertEqual(1, xs.count(9))
+        self.assertEqual(0, xs.count("a"))
+        self.assertEqual(L[[9, 8, 7]], L[list(reversed(xs))[:3]])
+        with self.assertRaises(ValueError): xs.index(10)
+        with self.assertRaises(ValueError): L[[]].index(1)
+
+        self.assertEqual(2, (-1 ^ L[[0, 1]]).index(1))
+        self.assertEqual([1, 0, -1], list(reversed(-1 ^ L[[0, 1]])))
+        self.assertEqual(5, L[1, 3, ...].index(11))
+        self.assertEqual(1, L[1, ..., 5].count(3))
+        self.assertEqual([5, 4, 3, 2, 1], list(reversed(L[1, ..., 5])))
+        with self.assertRaises(ValueError): L[1, 3, ...].index(10)
+
+        # backward slices evaluate the List only as far as their start
+        ys = L[(i for i in range(10))]
+        self.assertEqual(L[[3, 2, 1, 0]], ys[3::-1])
+        self.assertEqual(L[[3, 1]], ys[3:0:-2])
+        self.assertEqual("L[0, 1, 2, 3 ...]", str(ys))
+        self.assertEqual(L[[0, -1]], (-1 ^ ys)[1::-1])
+        self.assertEqual(L[[9, 8]], ys[20:7:-1])
+
     def test_contains(self):
         self.assertTrue(1 in L[2, 3, 1])
         self.assertFalse(1 not in L[2, 3, 1])
@@ -1898,6 +2372,406 @@ class TestList(unittest.TestCase):
         self.assertEqual(3, len(L[1, 2, 3]))
         self.assertEqual(20, len(L[0, ..., 19]))
 
+    def test_batched_forcing(self):
+        # long lists are evaluated and type checked in chunks
+        self.assertEqual(5000, len(L[(i for i in xrange(5000))]))
+        self.assertEqual(sum(range(5000)), sum(L[(i for i in xrange(5000))]))
+        self.assertEqual(range(5000), list(L[(i for i in xrange(5000))]))
+        self.assertEqual(L[[Just(1), Nothing, Just(3)]],
+                         L[(x for x in [Just(1), Nothing, Just(3)])])
+        with self.assertRaises(te): len(L[(x for x in [1, 2, "a", 4])])
+        with self.assertRaises(te): len(L[(x for x in [1, 2, True])])
+        with self.assertRaises(te):
+            len(L[(x for x in [Just(1), Just("a")])])
+
+        # errors from elements that are read ahead are only raised when those
+        # elements are needed
+        xs = L[(x for x in [1, 2, 3, "a", 5])]
+        self.assertEqual(L[1, 2, 3], xs[:3])
+        with self.assertRaises(te): xs[3]
+        with self.assertRaises(te): len(xs)
+        ys = L[(1 // x for x in [1, 1, 1, 0])]
+        self.assertEqual([1, 1, 1], list(ys[:3]))
+        with self.assertRaises(ZeroDivisionError): list(ys)
+
+        # a List whose tail failed is not taken to be only the elements
+        # before the error
+        from hask_ideas.Data.List import map
+        from hask_ideas.Prelude import show
+        def failing():
+            yield 1
+            yield 2
+            raise KeyError("failing")
+        zs = L[failing()]
+        with self.assertRaises(KeyError): len(zs)
+        self.assertEqual("L[1, 2 ...]", show(zs))
+        self.assertEqual(None, zs.to_array(False))
+        self.assertEqual(L[1, 2], zs[:2])
+        with self.assertRaises(KeyError): zs == L[1, 2]
+        with self.assertRaises(KeyError): zs.to_array()
+        with self.assertRaises(KeyError): list(map(__*2, zs))
+        with self.assertRaises(KeyError): list(zs)
+
+    def test_homogeneous(self):
+        self.assertEqual(set([int]), monotype_classes(1))
+        self.assertEqual(monotype_classes(len), monotype_classes(lambda x: x))
+        self.assertIsNone(monotype_classes((1, 2)))
+        self.assertIsNone(monotype_classes(Just(1)))
+        self.assertIsNone(monotype_classes(L[1, 2]))
+
+        # elements with the same classes are checked in one pass, and their
+        # type is kept with the List
+        xs = L[range(5000)]
+        self.assertIs(typeof(xs), typeof(xs[1:]))
+        self.assertEqual(L[LT, GT, EQ], L[[LT, GT, EQ]])
+        self.assertEqual(L[Just(1), Nothing], L[[Just(1), Nothing]])
+        self.assertEqual(L[[]], xs[5000:])
+        self.assertEqual(L[["a"]], "a" ^ xs[5000:])
+        with self.assertRaises(te): L[range(5000) + ["a"]]
+        with self.assertRaises(te): L[range(5000) + [True]]
+        with self.assertRaises(te): L[[LT, Nothing]]
+        with self.assertRaises(te): L[[Just(1), Just("a")]]
+        with self.assertRaises(te): L[[len, 1]]
+
+    def test_retain(self):
+        from hask_ideas.Data.List import iterate, take, drop
+
+        # only the last elements evaluated are kept
+        xs = iterate(__+1, 0).retain(10)
+        for x in xs:
+            if x == 5000:
+                break
+        self.assertEqual(5000, xs[5000])
+        self.assertEqual(L[4995, ..., 5000], xs[4995:5001])
+        self.assertEqual(6000, xs[6000])
+        self.assertEqual(L[7000, 7001], (xs[7000:])[:2])
+        with self.assertRaises(EvictedError): xs[0]
+        with self.assertRaises(EvictedError): xs[1:3]
+        with self.assertRaises(EvictedError): list(xs[:10])
+        with self.assertRaises(IndexError): xs[0]
+        self.assertLess(len(xs._List__spine.head), 2 * 10 + Spine.chunk_size)
+
+        # and memory stays bounded when indexing far ahead
+        xs = L[itertools.count()].retain(10)
+        self.assertEqual(300000, xs[300000])
+        self.assertLess(len(xs._List__spine.head), 2 * 10 + Spine.chunk_size)
+        with self.assertRaises(EvictedError): xs[5]
+        self.assertEqual(L[400000, 400001], take(2, drop(400000, xs)))
+        self.assertLess(len(xs._List__spine.head), 2 * 10 + Spine.chunk_size)
+        with self.assertRaises(EvictedError): xs[300000]
+
+        # consed elements are kept, and so is the window of copied lists
+        ys = -1 ^ iterate(__+1, 0).retain(1)
+        self.assertEqual(3000, ys[3001])
+        self.assertEqual(5000, ys[5001])
+        with self.assertRaises(EvictedError): ys[1]
+        self.assertEqual(-1, ys[0])
+        zs = -2 ^ ys[5001:]
+        self.assertEqual(L[-2, 5000, 5001], zs[:3])
+        self.assertEqual(9000, zs[4001])
+        with self.assertRaises(EvictedError): zs[1]
+
+        with self.assertRaises(ValueError): L[1, 2].retain(0)
+
+    def test_array_storage(self):
+        from hask_ideas.Data.List import sum, product, maximum, minimum, elem
+
+        # Lists of ints and floats are stored in arrays
+        xs = L[(i for i in xrange(1000))]
+        self.assertEqual(array.array("l", range(1000)), xs.to_array())
+        self.assertEqual(array.array("l", range(995, 1000)), xs[995:].to_array())
+        self.assertEqual(array.array("l", [-1, 0, 1]), (-1 ^ xs)[:3].to_array())
+        self.assertEqual(array.array("d", [1.0, 2.5]), L[1.0, 2.5].to_array())
+        self.assertIsNone(L["a", "b"].to_array())
+        self.assertIsNone(L[[Just(1)]].to_array())
+
+        self.assertEqual(L[0, ..., 999], xs)
+        self.assertEqual(L[[5, 6]], xs[5:7])
+        self.assertEqual(L[list(range(1000))], xs)
+        self.assertEqual(499500, sum(xs))
+        self.assertEqual(0, product(xs))
+        self.assertEqual(999, maximum(xs))
+        self.assertEqual(0, minimum(xs))
+        self.assertEqual(3.5, sum(L[1.0, 2.5]))
+        self.assertTrue(elem(999, xs))
+        self.assertFalse(elem(1000, xs))
+        self.assertTrue(elem(10 ** 6, L[0, ...]))
+        with self.assertRaises(te): L[range(5) + [1.0]]
+
+    def test_declared_type(self):
+        from hask_ideas.Data.Functor import fmap
+        from hask_ideas.Data.List import map, filter, length
+
+        evaluated = []
+        def ints(n):
+            for i in range(n):
+                evaluated.append(i)
+                yield i
+
+        # Lists with a declared element type are not evaluated to type them
+        xs = L[int][ints(5)]
+        with self.assertRaises(te): unify(typeof(L[int][[]]), typeof(L["a"]))
+        unify(typeof(xs), typeof(L[1, 2]))
+        with self.assertRaises(te): "a" ^ xs
+        with self.assertRaises(te): xs + L["a", "b"]
+        self.assertEqual(5, length(xs))
+        self.assertEqual(range(5), evaluated)
+
+        # and the type is passed along through typed functions
+        del evaluated[:]
+        inc = (lambda x: x + 1) ** (H/ int >> int)
+        even = (lambda x: x % 2 == 0) ** (H/ int >> bool)
+        ys = fmap(inc, filter(even, map(inc, L[int][ints(5)])))
+        self.assertEqual([], evaluated)
+        unify(typeof(ys), typeof(L[1, 2]))
+        self.assertEqual(L[3, 5], ys)
+        self.assertEqual(range(5), evaluated)
+
+        # sections are typed a -> b, so mapping one gives a List whose element
+        # type is not known, which is not evaluated by the call itself
+        del evaluated[:]
+        ys = map(__*2, L[int][ints(5)])
+        zs = map(__+1, filter(__>1, L[int][ints(5)]))
+        self.assertEqual([], evaluated)
+        self.assertEqual(L[0, 2, 4, 6, 8], ys)
+        self.assertEqual(L[3, 4, 5], zs)
+
+        # but its first element is evaluated when it is passed on to another
+        # typed function, which needs its type
+        del evaluated[:]
+        ys = filter(__>1, map(__*2, L[int][ints(5)]))
+        self.assertEqual([0], evaluated)
+        self.assertEqual(L[2, 4, 6, 8], ys)
+
+        # elements are still checked as they are evaluated
+        zs = L[int][(x for x in [1, 2, "a"])]
+        self.assertEqual(L[1, 2], zs[:2])
+        with self.assertRaises(te): len(zs)
+        with self.assertRaises(te): L[str][[1]]
+        with self.assertRaises(te): L[str][1, ...]
+
+        # consing onto a suffix past the evaluated elements, whose type is
+        # declared or already known, continues from the suffix
+        xs = L[int][(i for i in range(10))]
+        self.assertEqual(L[100, 3, 4, 5, 6, 7, 8, 9], 100 ^ xs[3:])
+        ys = L[(i for i in range(10))]
+        ys[0]
+        self.assertEqual(L[100, 5, 6, 7, 8, 9], 100 ^ ys[5:])
+        self.assertEqual(L[[100]], 100 ^ ys[12:])
+
+        unify(typeof(L[L[int]][[]]), typeof(L[[L[1, 2]]]))
+        unify(typeof(L[t(Maybe, int)][[Nothing]]), typeof(L[[Just(1)]]))
+        unify(typeof(L[H/ int >> int][[inc]]), typeof(L[[inc]]))
+        with self.assertRaises(te):
+            unify(typeof(L[L[str]][[]]), typeof(L[[L[1, 2]]]))
+
+    def test_threads(self):
+        n, errors = 20000, []
+        xs = L[(i for i in range(n))]
+        names = L[("x%d" % i for i in range(n))]
+        consed = []
+
+        def work(k):
+            try:
+                # every thread sees every element exactly once, in order
+                self.assertEqual(range(n), list(xs))
+                self.assertEqual(n - 1, xs[-1])
+                self.assertTrue(n - k - 1 in xs)
+                self.assertEqual(k, names.index("x%d" % k))
+                self.assertEqual(names[k], "x%d" % k)
+                self.assertEqual(xs[k:], L[range(k, n)])
+                consed.append((k, -k ^ xs))
+            except Exception as e:
+                errors.append(e)
+
+        interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)
+        try:
+            threads = [threading.Thread(target=work, args=(k,))
+                       for k in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.setcheckinterval(interval)
+
+        self.assertEqual([], errors)
+        self.assertEqual(n, len(xs))
+        self.assertEqual(n, len(names))
+        for k, ys in consed:
+            self.assertEqual(-k, ys[0])
+            self.assertEqual(L[-k, 0, 1], ys[:3])
+
+    def test_prefetch(self):
+        from hask_ideas.Data.List import take
+
+        produced, closed = [], []
+        def numbers():
+            try:
+                for i in itertools.count():
+                    produced.append(i)
+                    yield i
+            finally:
+                closed.append(True)
+
+        # elements come out in order
+        xs = L[numbers()].prefetch(10)
+        self.assertEqual(L[range(5)], take(5, xs))
+        self.assertEqual(L[range(5, 10)], xs[5:10])
+
+        # and the thread stops once the List is no longer used
+        del xs
+        for _ in range(100):
+            if closed:
+                break
+            time.sleep(0.01)
+        self.assertEqual([True], closed)
+
+        # errors are raised when the List reaches them
+        def failing():
+            yield 1
+            yield 2
+            raise ValueError("failing")
+        ys = L[failing()].prefetch(5)
+        self.assertEqual(L[1, 2], ys[:2])
+        with self.assertRaises(ValueError): len(ys)
+        with self.assertRaises(ValueError): L[failing()].prefetch(0)
+
+        zs = L[(x for x in "abc")].prefetch(2)
+        self.assertEqual(L["a", "b", "c"], zs)
+        self.assertEqual(L[[]], L[(x for x in [])].prefetch(1))
+        self.assertEqual(L[1, 2, 3], L[[1, 2, 3]].prefetch(1))
+
+        # arithmetic sequences compute their elements where they are used
+        ns = L[1, ...].prefetch(5)
+        self.assertNotIsInstance(ns._List__spine.tail, Prefetcher)
+        self.assertEqual(L[1, 2, 3], ns[:3])
+
+        # threads still running at exit are stopped before the interpreter
+        # is torn down
+        script = ("from hask_ideas import L\n"
+                  "xs = L[(i for i in iter(int, 1))].prefetch(5)\n"
+                  "xs[3]\n")
+        import hask_ideas
+        root = os.path.dirname(os.path.dirname(hask_ideas.__file__))
+        process = subprocess.Popen([sys.executable, "-c", script],
+                                   cwd=os.path.abspath(root),
+                                   stderr=subprocess.PIPE)
+        self.assertEqual("", process.communicate()[1])
+
+    def test_records(self):
+        from hask_ideas.Data.List import take, drop, filter, reverse, length
+        from hask_ideas.Prelude import show
+
+        def temporary_file(contents):
+            fd, path = tempfile.mkstemp()
+            os.write(fd, contents)
+            os.close(fd)
+            self.addCleanup(os.remove, path)
+            return path
+
+        # lines are found only as far as they are used, and are not kept
+        path = temporary_file("".join("line %d\n" % i for i in range(5000)))
+        xs = records(path)
+        self.assertEqual("line 3", xs[3])
+        self.assertTrue(len(xs._List__spine.range.file.ends) < 5000)
+        self.assertEqual(L["line 10", "line 11"], take(2, drop(10, xs)))
+        self.assertEqual(0, len(take(0, drop(10, xs))))
+        self.assertEqual(5000, length(xs))
+        self.assertEqual("line 4999", xs[-1])
+        self.assertEqual(L["line 4999", "line 4998"], take(2, reverse(xs)))
+        self.assertEqual(L["line 4", "line 1004"], xs[4:2000:1000])
+        self.assertEqual(L["line 4000", "line 5"], xs[4000:4:-3995])
+        self.assertEqual(L["line 5", "line 6"],
+                         take(2, filter(__ > "line 4998", xs)))
+        self.assertEqual(L[["line %d" % i for i in range(5000)]], xs)
+        self.assertTrue("line 42" in xs)
+        self.assertEqual(42, xs.index("line 42"))
+        self.assertEqual(1, xs.count("line 42"))
+        self.assertEqual(hash(L[["line %d" % i for i in range(5000)]]),
+                         hash(xs))
+        self.assertEqual(hash(L[["line 1", "line 2"]]), hash(xs[1:3]))
+        self.assertEqual(0, len(xs._List__spine.head))
+        with self.assertRaises(IndexError): xs[5000]
+        with self.assertRaises(te): xs == L[1, 2]
+
+        # other delimiters, empty records, and files without a last delimiter
+        self.assertEqual(L["a", "", "b"], records(temporary_file("a;;b"),
+                                                  delimiter=";"))
+        self.assertEqual(L[[""]], records(temporary_file("\n")))
+        self.assertEqual(L[str][[]], records(temporary_file("")))
+
+        # fixed-width records, decoded into elements
+        numbers = records(temporary_file("0001002003000400"), width=4,
+                          decode=int)
+        self.assertEqual(L[1, 20, 300, 400], numbers)
+        self.assertEqual(L[400, 300], numbers[:1:-1])
+        self.assertEqual(4, len(numbers))
+        self.assertEqual(None, numbers.to_array())
+        with self.assertRaises(ValueError): records(path, width=7)
+
+        # decoded elements are type checked, against a declared type too
+        mixed = temporary_file("1\nx\n3\n")
+        number = lambda r: int(r) if r.isdigit() else r
+        ms = records(mixed, decode=number)
+        self.assertEqual((1, 3), (ms[0], ms[2]))
+        with self.assertRaises(te): ms[1]
+        with self.assertRaises(te): list(ms)
+        with self.assertRaises(te): ms[1:] == L[2, 3]
+        with self.assertRaises(te): records(mixed, decode=str,
+                                            element_type=int)[0]
+        with self.assertRaises(ValueError): records(path, width=0)
+        with self.assertRaises(ValueError): records(path, delimiter="")
+
+        # records can be buffers into the file instead of copies
+        buffers = records(path, copy=False)
+        self.assertEqual(buffer, type(buffers[7]))
+        self.assertEqual("line 7", str(buffers[7]))
+        self.assertEqual("L[buffer('line 0') ...]", show(buffers))
+
+
+class TestStream(unittest.TestCase):
+
+    def test_stream(self):
+        from hask_ideas.Data.List import map, filter, foldl, takeWhile, zip
+        from hask_ideas.Data.List import sum, length
+
+        # Streams have list types, and only evaluate what they need to
+        evaluated = []
+        xs = Stream((evaluated.append(i) or i for i in xrange(100)), int)
+        unify(typeof(xs), typeof(L[1, 2]))
+        self.assertEqual([], evaluated)
+        with self.assertRaises(te): unify(typeof(xs), typeof(L["a", "b"]))
+        unify(typeof(Stream(iter([1, 2]))), typeof(L[1, 2]))
+
+        # single pass functions return Streams, and keep them lazy
+        inc = (lambda x: x + 1) ** (H/ int >> int)
+        even = (lambda x: x % 2 == 0) ** (H/ int >> bool)
+        ys = filter(even, map(inc, Stream(xrange(10), int)))
+        self.assertIsInstance(ys, Stream)
+        self.assertEqual(30, sum(ys))
+        self.assertEqual(10, length(Stream(xrange(10))))
+        self.assertEqual(10, foldl((lambda a, b: a + b) ** \
+                                   (H/ int >> int >> int), 0, Stream(range(5))))
+        self.assertEqual(L[0, 1, 2],
+            L[takeWhile((lambda x: x < 3) ** (H/ int >> bool), Stream(xs))])
+        self.assertEqual(range(4), evaluated)
+        self.assertEqual([(0, "a"), (1, "b")],
+                         list(zip(Stream(range(2)), L["a", "b", "c"])))
+        self.assertIsInstance(map(inc, L[1, 2]), List)
+
+        # Streams can only be traversed once
+        zs = Stream(range(3))
+        self.assertEqual([0, 1, 2], list(zs))
+        with self.assertRaises(StreamConsumedError): list(zs)
+        with self.assertRaises(StreamConsumedError): length(zs)
+
+        # elements are type checked as they are evaluated
+        with self.assertRaises(te): list(Stream([1, 2, "a"]))
+        with self.assertRaises(te): list(Stream(["a"], int))
+        with self.assertRaises(te): map(inc, Stream(["a"]))
+
 
 class TestDataList(unittest.TestCase):
 
@@ -1999,6 +2873,13 @@ class TestDataList(unittest.TestCase):
         self.assertEquals(L[[]], unfoldr(uf, 6))
         self.assertEquals(L[1, ..., 6], unfoldr(uf, 0))
 
+        self.assertEquals(L[0, 1, 3, 6], scanl(__+__, 0, L[1, 2, 3]))
+        self.assertEquals(L[[0]], scanl(__+__, 0, L[[]]))
+        self.assertEquals(L[0, 1, 3, 6], scanl(__+__, 0, L[1, ...])[:4])
+        self.assertEquals(L[1, 2, 6, 24], scanl1(__*__, L[1, ..., 4]))
+        self.assertEquals(L[[]], scanl1(__*__, L[[]]))
+        self.assertEquals(L[1, 3, 6], scanl1(__+__, L[1, ...])[:3])
+
     def test_sublists(self):
         from hask_ideas.Data.List import take, drop, splitAt, takeWhile, dropWhile
         from hask_ideas.Data.List import dropWhileEnd, span, break_, stripPrefix
@@ -2084,6 +2965,7 @@ class TestDataList(unittest.TestCase):
         self.assertEqual(L[[]], nub(L[[]]))
         self.assertEqual(L[[1]], nub(L[[1]]))
         self.assertEqual(L[[1]], nub(L[[1, 1]]))
+        self.assertEqual(L[[L[[1]]]], nub(L[L[[1]], L[[1]]]))
 
     def test_ordered_lists(self):
         from hask_ideas.Data.List import sort, sortOn, insert
@@ -2101,6 +2983,143 @@ class TestDataList(unittest.TestCase):
         from hask_ideas.Data.List import genericIndex, genericReplicate
 
 
+    def test_map_concurrent(self):
+        from hask_ideas.Data.List import mapConcurrent, take
+
+        running, most_running = [0], [0]
+        lock = threading.Lock()
+
+        @sig(H/ int >> int)
+        def slow_double(x):
+            with lock:
+                running[0] += 1
+                most_running[0] = max(most_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            if x < 0:
+                raise ValueError(x)
+            return x * 2
+
+        # the results are in order, with at most n calls running at once
+        self.assertEqual(L[0, 2, ..., 98], mapConcurrent(4, slow_double,
+                                                         L[0, ..., 49]))
+        self.assertTrue(1 < most_running[0] <= 4)
+        self.assertEqual(L[0, 2, 4], take(3, mapConcurrent(2, slow_double,
+                                                           L[0, ...])))
+        self.assertEqual(L[[]], mapConcurrent(2, slow_double, L[[]]))
+
+        # errors are raised when their result is reached
+        xs = mapConcurrent(3, slow_double, L[[1, 2, -1, 4]])
+        self.assertEqual(L[2, 4], xs[:2])
+        with self.assertRaises(ValueError): len(xs)
+        with self.assertRaises(ValueError): mapConcurrent(0, slow_double, xs)
+
+    def test_chained_transformations(self):
+        from hask_ideas.Data.List import map, filter, takeWhile, dropWhile
+        from hask_ideas.Data.List import zip, zipWith, concatMap, foldl, sum
+        from hask_ideas.Data.List import length, and_, or_, any, all
+
+        ys = map(__+1, L[(x for x in range(100))])
+        self.assertEqual(2090, sum(map(__*2, filter(__>=90, ys))))
+        self.assertEqual(1, length(takeWhile(__<2, ys)))
+        self.assertEqual(99, length(dropWhile(__<2, ys)))
+        self.assertEqual(4950, foldl(__+__, 0, zipWith(__-__, ys, L[[1] * 100])))
+        self.assertEqual(L[1, ..., 100], ys)
+        self.assertEqual(L[(1, 1), (2, 2)], zip(ys, L[1, ...])[:2])
+
+        # the elements of a List are computed once, however often it is used
+        dup = (lambda x: L[x, x]) ** (H/ int >> [int])
+        calls = []
+        g = (lambda x: calls.append(x) or x * 2) ** (H/ int >> int)
+        zs = map(g, L[1, 2, 3])
+        self.assertEqual((12, 12, 3), (sum(zs), sum(zs), length(zs)))
+        self.assertEqual([1, 2, 3], calls)
+
+        # and are type checked, whichever function consumes the List
+        f = (lambda x: "a" if x == 2 else x) ** (H/ int >> "a")
+        with self.assertRaises(te): length(map(f, L[1, 2, 3]))
+        with self.assertRaises(te): foldl(__+__, 0, map(f, L[1, 2, 3]))
+
+        # chains run as one loop, without evaluating the Lists in between
+        del calls[:]
+        xs = map(g, L[(x for x in range(100))])
+        evens = filter((lambda x: x % 4 == 0) ** (H/ int >> bool), xs)
+        self.assertEqual(9800, sum(map(__*2, evens)))
+        self.assertEqual(range(100), calls)
+        self.assertFalse(xs.is_evaluated() or evens.is_evaluated())
+        pairs = zip(map(__+1, L[1, 3, ...]), concatMap(dup, L[1, ...]))
+        self.assertEqual(L[(2, 1), (4, 1), (6, 2)], pairs[:3])
+
+        # with the same elements as the Lists in between, which are computed
+        # at most once more if those Lists are used after all
+        self.assertEqual(L[0, 2, ..., 198], xs)
+        self.assertEqual(L[0, 4, ..., 196], evens)
+        self.assertEqual(sorted(range(100) * 2), sorted(calls))
+
+        # which are type checked, and fail as late as they would when used
+        f = (lambda x: "a" if x == 3 else x) ** (H/ int >> "a")
+        with self.assertRaises(te): length(filter(__>0, map(f, L[1, ..., 5])))
+        with self.assertRaises(te): L[int][(x for x in "a")] + L[1]
+        with self.assertRaises(te): length(takeWhile(__<9, L[int][["a"]]))
+        self.assertEqual(L[[1]], takeWhile(__<2, map(f, L[1, ..., 5])))
+
+        # and the chains are as lazy as before
+        self.assertEqual(L[2, 4, 6], takeWhile(__<7, map(__*2, L[1, ...])))
+        self.assertEqual(6, length(takeWhile(__<7, map(__+0, L[1, ...]))))
+        self.assertFalse(and_(map(__<5, L[1, ...])))
+        self.assertTrue(or_(map(__>5, L[1, ...])))
+        self.assertTrue(any(__>5, map(__*2, L[1, ...])))
+        self.assertFalse(all(__<5, filter(__>1, L[1, ...])))
+        self.assertEqual(L[1, 1, 2, 2, 3], concatMap(dup, L[1, ...])[:5])
+        self.assertEqual(L[[]], concatMap(dup, L[[]]))
+
+    def test_vectorised(self):
+        # the same results, whether or not NumPy is used
+        from hask_ideas.Data.List import map, zipWith, scanl, scanl1
+        from hask_ideas.Data.List import sum, product, maximum, minimum
+
+        xs = L[array.array("l", range(1, 6))]
+        fs = L[array.array("d", [0.5, 1.5, 2.5])]
+        self.assertEqual(L[2, 4, 6, 8, 10], map(__*2, xs))
+        self.assertEqual(L[9, 8, 7, 6, 5], map(10-__, xs))
+        self.assertEqual(L[1.0, 3.0, 5.0], map(__*2, fs))
+        self.assertEqual(L[True, False], map(__<2, xs)[:2])
+        self.assertEqual(L[2, 4, 6], zipWith(__*__, xs, L[2, 2, 2]))
+        self.assertEqual(L[0, 0, 0], zipWith(__-__, xs, xs)[:3])
+        self.assertEqual(L[0, 1, 3, 6, 10, 15], scanl(__+__, 0, xs))
+        self.assertEqual(L[1, 3, 6, 10, 15], scanl1(__+__, xs))
+        self.assertEqual(L[0.5, 0.75, 1.875], scanl1(__*__, fs))
+        self.assertEqual(15, sum(xs))
+        self.assertEqual(4.5, sum(fs))
+        self.assertEqual(1.875, product(fs))
+        self.assertEqual((1, 5), (minimum(xs), maximum(xs)))
+        self.assertEqual((0.5, 2.5), (minimum(fs), maximum(fs)))
+        self.assertIs(int, type(sum(xs)))
+        self.assertIs(float, type(maximum(fs)))
+
+        # floats are summed and multiplied in order, and the first of equal
+        # extremes is returned, as by the folds and by Python's min and max
+        tenths = [0.1] * 10
+        self.assertEqual(reduce(lambda a, b: a + b, tenths, 0), sum(L[tenths]))
+        self.assertEqual(reduce(lambda a, b: a * b, [1.1] * 7, 1),
+                         product(L[[1.1] * 7]))
+        self.assertEqual("0.0", repr(sum(L[[-0.0]])))
+        self.assertEqual("-0.0", repr(maximum(L[[-0.0, 0.0]])))
+        self.assertEqual("0.0", repr(minimum(L[[0.0, -0.0]])))
+        nan = float("nan")
+        self.assertEqual(2.0, maximum(L[[1.0, nan, 2.0]]))
+        self.assertEqual(1.0, minimum(L[[1.0, nan, 2.0]]))
+        self.assertTrue(math.isnan(maximum(L[[nan, 1.0, 2.0]])))
+
+        # ints that would overflow a machine word become longs, as in Python
+        big = L[array.array("l", [sys.maxint, -sys.maxint])]
+        self.assertEqual(L[2 * sys.maxint, -2 * sys.maxint], map(__*2, big))
+
+        # Lists that are not fully evaluated are mapped lazily
+        self.assertEqual(L[2, 4, 6], map(__*2, L[1, ...])[:3])
+
+
 class TestPrelude(unittest.TestCase):
 
     def test_imports(self):